@@ -0,0 +1,307 @@
+"""
+Headless batch runner for the Blokus search puzzles.
+
+Every case of a benchmark matrix runs in its own process, without a GUI,
+under a wall-clock and a memory limit, and the cost, expansions, wall time
+and peak RSS of each case are written to a CSV and/or JSON report. Given a
+baseline report (the JSON of an earlier run), cases that got slower, more
+expensive or stopped solving are reported and the run exits with status 1.
+
+A matrix file is JSON holding a list of cases, or an object whose "matrix"
+entry maps each case field to a list of values to take every combination
+of (and whose "cases" entry lists more cases). Case fields:
+
+- pieces: a piece file from layouts/ (default valid_pieces.txt)
+- size: [rows, cols] like game.py -s (default [5, 5])
+- puzzle: fill, corners, cover, sub-optimal or mini-contest
+- targets: [[row, col], ...] for cover, sub-optimal and mini-contest
+- search: a game.py -f search function (default astar)
+- heuristic: a heuristic name like game.py -H (default null_heuristic)
+- start, engine, lazy, symmetry, weight, beam_width, max_nodes, max_mb,
+  workers and time_limit: like the game.py options of the same name
+
+    python benchmark.py -c cases.json --csv report.csv --json report.json
+    python benchmark.py -c cases.json --baseline report.json
+"""
+
+import csv
+import itertools
+import json
+import multiprocessing
+import resource
+import sys
+import time
+
+from displays import NoDisplay
+from game import make_problem, make_search_func, load_heuristic, SIMPLE_SEARCHES
+from pieces import PieceList
+from search import SearchStats
+
+CASE_DEFAULTS = {
+    'pieces': 'valid_pieces.txt',
+    'size': [5, 5],
+    'puzzle': 'corners',
+    'targets': None,
+    'search': 'astar',
+    'heuristic': 'null_heuristic',
+    'start': [0, 0],
+    'engine': 'array',
+    'lazy': False,
+    'symmetry': False,
+    'weight': 1.5,
+    'beam_width': 100,
+    'max_nodes': 100000,
+    'max_mb': None,
+    'workers': None,
+    'time_limit': None,
+}
+
+DEFAULT_MATRIX = {
+    'cases': [
+        {'pieces': 'tiny_set.txt', 'size': [4, 7], 'puzzle': 'fill', 'search': 'dfs'},
+        {'size': [4, 4], 'puzzle': 'corners', 'search': 'ucs'},
+        {'size': [5, 5], 'puzzle': 'corners', 'heuristic': 'blokus_corners_heuristic'},
+        {'size': [5, 5], 'puzzle': 'corners', 'heuristic': 'blokus_corners_reachability_heuristic'},
+        {'size': [6, 6], 'puzzle': 'cover', 'targets': [[3, 3], [5, 1]], 'heuristic': 'blokus_cover_heuristic'},
+        {'size': [6, 6], 'puzzle': 'cover', 'targets': [[3, 3], [5, 1]],
+         'heuristic': 'blokus_cover_reachability_heuristic'},
+        {'size': [10, 10], 'puzzle': 'sub-optimal', 'targets': [[5, 5], [9, 2], [2, 8]], 'time_limit': 1.0},
+    ]
+}
+
+REPORT_FIELDS = ['name', 'status', 'cost', 'expanded', 'generated', 'wall_time', 'peak_rss_kb', 'error']
+
+
+def expand_matrix(spec):
+    """
+    Returns the list of cases (dicts with every field of CASE_DEFAULTS plus a
+    name) that the matrix file contents <spec> describe.
+    """
+    if isinstance(spec, list):
+        spec = {'cases': spec}
+    cases = list(spec.get('cases', []))
+    matrix = spec.get('matrix', {})
+    if matrix:
+        fields = sorted(matrix)
+        for values in itertools.product(*[matrix[field] for field in fields]):
+            cases.append(dict(zip(fields, values)))
+
+    expanded = []
+    for case in cases:
+        unknown = set(case) - set(CASE_DEFAULTS) - {'name'}
+        if unknown:
+            raise ValueError('unknown case fields: %s' % ', '.join(sorted(unknown)))
+        full = dict(CASE_DEFAULTS)
+        full.update(case)
+        full.setdefault('name', case_name(full))
+        expanded.append(full)
+    return expanded
+
+
+def case_name(case):
+    """
+    A name identifying <case> in reports, built from the fields that differ
+    from CASE_DEFAULTS.
+    """
+    parts = [case['puzzle'], '%dx%d' % tuple(case['size'])]
+    if case['puzzle'] not in ['sub-optimal', 'mini-contest']:
+        parts.append(case['search'])
+        if case['search'] not in SIMPLE_SEARCHES:
+            parts.append(case['heuristic'])
+    for field in sorted(CASE_DEFAULTS):
+        if field in ['puzzle', 'size', 'search', 'heuristic']:
+            continue
+        if case[field] != CASE_DEFAULTS[field]:
+            parts.append('%s=%s' % (field, json.dumps(case[field], separators=(',', ':'))))
+    return ' '.join(parts)
+
+
+def run_case(case, connection, max_mb):
+    """
+    Solves <case> in a worker process and sends its result dict through
+    <connection>.
+    """
+    if max_mb is not None:
+        limit = max_mb * 1024 * 1024
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+
+    result = {'name': case['name'], 'status': 'ok', 'cost': None, 'expanded': None, 'generated': None,
+              'wall_time': None, 'peak_rss_kb': None, 'error': ''}
+    try:
+        piece_list = PieceList(case['pieces'])
+        targets = [tuple(target) for target in case['targets']] if case['targets'] is not None else None
+        problem = make_problem(case['puzzle'], case['size'][1], case['size'][0], piece_list, tuple(case['start']),
+                               targets, case['engine'], case['lazy'], case['time_limit'],
+                               case['symmetry'])
+        stats = SearchStats()
+
+        start = time.perf_counter()
+        if case['puzzle'] in ['sub-optimal', 'mini-contest']:
+            back_trace = problem.solve()
+        else:
+            search_func = make_search_func(case['search'], case['weight'], case['beam_width'], case['max_nodes'],
+                                           case['max_mb'], case['workers'])
+            if case['search'] in SIMPLE_SEARCHES:
+                back_trace = search_func(problem, stats=stats)
+            else:
+                back_trace = search_func(problem, load_heuristic(case['heuristic']), stats=stats)
+        result['wall_time'] = time.perf_counter() - start
+
+        # Replay the plan the way game.py does, only without drawing it
+        display = NoDisplay()
+        board = problem.get_start_state().__copy__()
+        for action in back_trace:
+            board.add_move(0, action)
+            display.draw_board(board, dots=targets or ())
+        goal_problem = getattr(problem, 'cover_problem', problem)
+        if not goal_problem.is_goal_state(board):
+            result['status'] = 'unsolved'
+        result['cost'] = board.score(0)
+        result['expanded'] = problem.expanded
+        result['generated'] = stats.generated if stats.expanded else None
+    except MemoryError:
+        result['status'] = 'memory'
+    except Exception as e:
+        result['status'] = 'error'
+        result['error'] = '%s: %s' % (e.__class__.__name__, e)
+    result['peak_rss_kb'] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    connection.send(result)
+    connection.close()
+
+
+def run_benchmark(cases, time_limit=60.0, max_mb=2048, log=sys.stdout):
+    """
+    Runs every case in its own process, killing it after <time_limit>
+    seconds, with its address space capped to <max_mb> megabytes (None for
+    no cap). Returns the list of result dicts, in the order of <cases>.
+    """
+    if 'fork' in multiprocessing.get_all_start_methods():
+        context = multiprocessing.get_context('fork')
+    else:
+        context = multiprocessing.get_context()
+
+    results = []
+    for case in cases:
+        (receiver, sender) = context.Pipe(duplex=False)
+        worker = context.Process(target=run_case, args=(case, sender, max_mb))
+        start = time.perf_counter()
+        worker.start()
+        sender.close()
+        if receiver.poll(time_limit):
+            try:
+                result = receiver.recv()
+            except EOFError:
+                result = None
+        else:
+            result = None
+        worker.terminate()
+        worker.join()
+
+        if result is None:
+            timed_out = time.perf_counter() - start >= time_limit
+            result = {'name': case['name'], 'status': 'timeout' if timed_out else 'crashed', 'cost': None,
+                      'expanded': None, 'generated': None, 'wall_time': None, 'peak_rss_kb': None,
+                      'error': '' if timed_out else 'exit code %s' % worker.exitcode}
+        results.append(result)
+        if log is not None:
+            print('%-8s cost %-4s expanded %-8s %7s s  %s' %
+                  (result['status'], result['cost'], result['expanded'],
+                   '%.2f' % result['wall_time'] if result['wall_time'] is not None else '-', result['name']), file=log)
+            log.flush()
+    return results
+
+
+def write_csv(results, path):
+    with open(path, 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=REPORT_FIELDS)
+        writer.writeheader()
+        for result in results:
+            writer.writerow(result)
+
+
+def write_json(results, path):
+    with open(path, 'w') as f:
+        json.dump(results, f, indent=2)
+
+
+def find_regressions(results, baseline, tolerance=0.25, min_seconds=0.5):
+    """
+    Compares <results> with the <baseline> results of the same names and
+    returns a list of messages, one per regression:
+    - a case the baseline solved that is no longer solved
+    - a higher cost
+    - more than <tolerance> (a fraction) more expansions
+    - more than <tolerance> more wall time, ignoring cases under
+      <min_seconds> in both runs since their timings are mostly noise
+    """
+    by_name = {result['name']: result for result in baseline}
+    regressions = []
+    for result in results:
+        old = by_name.get(result['name'])
+        if old is None or old['status'] != 'ok':
+            continue
+        name = result['name']
+        if result['status'] != 'ok':
+            regressions.append('%s: %s (was ok)' % (name, result['status']))
+            continue
+        if old['cost'] is not None and result['cost'] > old['cost']:
+            regressions.append('%s: cost %s (was %s)' % (name, result['cost'], old['cost']))
+        if old['expanded'] is not None and result['expanded'] > old['expanded'] * (1 + tolerance):
+            regressions.append('%s: expanded %s (was %s)' % (name, result['expanded'], old['expanded']))
+        if (old['wall_time'] is not None and max(result['wall_time'], old['wall_time']) >= min_seconds and
+                result['wall_time'] > old['wall_time'] * (1 + tolerance)):
+            regressions.append('%s: %.2f s (was %.2f s)' % (name, result['wall_time'], old['wall_time']))
+    return regressions
+
+
+def main():
+    """
+    Processes the command used to run the benchmark from the command line.
+    """
+    from optparse import OptionParser
+    usage_str = """
+    USAGE:      python benchmark.py <options>
+    EXAMPLES:  (1) python benchmark.py --json baseline.json
+                  - runs the built-in cases and saves the report
+               (2) python benchmark.py -c cases.json --csv report.csv --baseline baseline.json
+                  - runs the cases of cases.json and fails on regressions against baseline.json
+    """
+    parser = OptionParser(usage_str)
+    parser.add_option('-c', '--cases', dest='cases_file', metavar='FILE',
+                      help='the JSON benchmark matrix to run (default: a few built-in cases)', default=None)
+    parser.add_option('-t', '--time-limit', dest='time_limit', type='float',
+                      help='seconds each case may run', default=60.0)
+    parser.add_option('-M', '--max-mb', dest='max_mb', type='int',
+                      help='megabytes of address space each case may use (0 for no limit)', default=2048)
+    parser.add_option('--csv', dest='csv_file', metavar='FILE', help='write the report as CSV to FILE')
+    parser.add_option('--json', dest='json_file', metavar='FILE', help='write the report as JSON to FILE')
+    parser.add_option('-b', '--baseline', dest='baseline_file', metavar='FILE',
+                      help='a JSON report to check the results against')
+    parser.add_option('--tolerance', dest='tolerance', type='float',
+                      help='how much worse (as a fraction) expansions and time may get before failing', default=0.25)
+
+    options, _ = parser.parse_args()
+    if options.cases_file is not None:
+        with open(options.cases_file) as f:
+            spec = json.load(f)
+    else:
+        spec = DEFAULT_MATRIX
+
+    results = run_benchmark(expand_matrix(spec), options.time_limit, options.max_mb or None)
+    if options.csv_file is not None:
+        write_csv(results, options.csv_file)
+    if options.json_file is not None:
+        write_json(results, options.json_file)
+
+    if options.baseline_file is not None:
+        with open(options.baseline_file) as f:
+            baseline = json.load(f)
+        regressions = find_regressions(results, baseline, options.tolerance)
+        for regression in regressions:
+            print('REGRESSION ' + regression)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
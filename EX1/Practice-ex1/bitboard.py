@@ -0,0 +1,415 @@
+import numpy as np
+
+from board import (Move, anchored_placements, symmetric_equal, symmetric_key, symmetric_zobrists,
+                   symmetric_zobrists_after, zobrist_after, zobrist_table)
+
+
+class BitBoard:
+
+    """
+    A BitBoard is a drop-in replacement for board.Board that keeps the game
+    state in packed Python integers instead of NumPy arrays.
+
+    Cell (x, y) is bit y * board_w + x of every bitboard. The BitBoard stores:
+    - board_w/board_h: the width and height of the playing area
+    - occupied: a list with one bitboard per player of the tiles they placed
+    - illegal: a list with one bitboard per player. A bit is set iff the cell
+      is taken or edge-adjacent to one of that player's own tiles
+    - connected: a list with one bitboard per player. A bit is set iff the
+      cell is diagonally connected to one of the player's tiles (or is their
+      starting corner)
+    - pieces: the same (num_players x num_pieces) availability array as Board
+    - zobrist: the same Zobrist hash Board keeps
+    - symmetries/symmetric_zobrists: the same symmetries Board keeps
+    - piece_list: A PieceList object (probably shared with the game engine) to
+      help understand the moves
+
+    Since Python integers are immutable, copying a BitBoard only copies a few
+    references, and a move is legal iff its placement mask does not intersect
+    illegal[player] and does intersect connected[player]. A player's anchors
+    are simply connected[player] & ~illegal[player].
+    """
+
+    def __init__(self, board_w, board_h, num_players, piece_list, starting_point=(0, 0)):
+        self.board_w = board_w
+        self.board_h = board_h
+        self.num_players = num_players
+        self.scores = [0] * self.num_players
+
+        self.occupied = [0] * num_players
+        self.illegal = [0] * num_players
+        self.connected = [0] * num_players
+        self.connected[0] = self._bit(starting_point[1], starting_point[0])
+
+        self.piece_list = piece_list
+        self.pieces = np.full((num_players, piece_list.get_num_pieces()), True, np.bool_)
+        self._zobrist_keys = zobrist_table(num_players, board_w, board_h, piece_list.get_num_pieces())
+        self.zobrist = 0
+        self.symmetries = ()
+        self.symmetric_zobrists = ()
+        self._undo = []
+
+        self._full = (1 << (board_w * board_h)) - 1
+        not_left = 0
+        not_right = 0
+        for y in range(board_h):
+            for x in range(board_w):
+                if x > 0:
+                    not_left |= self._bit(x, y)
+                if x < board_w - 1:
+                    not_right |= self._bit(x, y)
+        self._not_left = not_left
+        self._not_right = not_right
+        self._orientations = self._build_orientation_table()
+
+    @classmethod
+    def from_board(cls, board):
+        """
+        Returns a BitBoard of the same position as <board>, a Board or a
+        BitBoard (which is copied).
+        """
+        if isinstance(board, BitBoard):
+            return board.__copy__()
+        bit_board = cls(board.board_w, board.board_h, board.num_players, board.piece_list)
+        for p in range(board.num_players):
+            bit_board.occupied[p] = bit_board._from_array(board.state == p)
+            bit_board.illegal[p] = bit_board._from_array(~board.legal_mask(p))
+            bit_board.connected[p] = bit_board._from_array(board.connected[p])
+        bit_board.pieces = np.copy(board.pieces)
+        bit_board.scores = list(board.scores)
+        bit_board.zobrist = board.zobrist
+        bit_board.symmetries = board.symmetries
+        bit_board.symmetric_zobrists = board.symmetric_zobrists
+        return bit_board
+
+    def _bit(self, x, y):
+        return 1 << (y * self.board_w + x)
+
+    def _build_orientation_table(self):
+        """
+        For every piece id, list the bitboard of each orientation placed at
+        (0, 0), indexed by orientation id.
+        """
+        table = []
+        for piece_orientations in self.piece_list.orientations:
+            masks = []
+            for ori in piece_orientations:
+                mask = 0
+                for (x, y) in ori.tiles:
+                    mask |= self._bit(x, y)
+                masks.append(mask)
+            table.append(masks)
+        return table
+
+    def set_starting_point(self, player, starting_point):
+        """
+        Mark (row, col) <starting_point> as a corner <player> may start from.
+        """
+        self.connected[player] |= self._bit(starting_point[1], starting_point[0])
+
+    def set_symmetries(self, symmetries):
+        """
+        Makes this board (and the boards played from it) equal to its images
+        under the board_symmetries <symmetries>.
+        """
+        self.symmetries = tuple(symmetries)
+        self.symmetric_zobrists = symmetric_zobrists(self)
+
+    def move_mask(self, move):
+        """
+        Returns the bitboard covered by <move>, or None if it leaves the board.
+        """
+        mask = 0
+        for (xi, yi) in move.orientation:
+            (x, y) = (xi + move.x, yi + move.y)
+            if x < 0 or x >= self.board_w or y < 0 or y >= self.board_h:
+                return None
+            mask |= self._bit(x, y)
+        return mask
+
+    def _edges(self, mask):
+        """
+        Returns the cells edge-adjacent to <mask>.
+        """
+        w = self.board_w
+        return (((mask & self._not_left) >> 1)
+                | ((mask & self._not_right) << 1)
+                | (mask >> w)
+                | (mask << w)) & self._full
+
+    def _diagonals(self, mask):
+        """
+        Returns the cells diagonally adjacent to <mask>.
+        """
+        w = self.board_w
+        left = (mask & self._not_left) >> 1
+        right = (mask & self._not_right) << 1
+        sides = left | right
+        return ((sides >> w) | (sides << w)) & self._full
+
+    def add_move(self, player, move):
+        """
+        Try to add <player>'s <move>.
+
+        If the move is legal, the board state is updated; if it's not legal, a
+        ValueError is raised.
+
+        Returns the number of tiles placed on the board.
+        """
+        if not self.check_move_valid(player, move):
+            raise ValueError("Move is not allowed")
+
+        piece = move.piece
+        self.pieces[player, move.piece_index] = False  # mark piece as used
+        self.zobrist = zobrist_after(self, player, move)
+        if self.symmetries:
+            self.symmetric_zobrists = symmetric_zobrists_after(self, player, move)
+
+        mask = self.move_mask(move)
+        self.occupied[player] |= mask
+
+        # Nobody can play on these squares
+        for p in range(self.num_players):
+            self.illegal[p] |= mask
+
+        # This player can't play next to them, and the diagonals are now attached
+        self.illegal[player] |= self._edges(mask)
+        self.connected[player] |= self._diagonals(mask)
+
+        self.scores[player] += piece.get_num_tiles()
+        return piece.get_num_tiles()
+
+    def do_move(self, player, move):
+        """
+        Performs a move, returning a new board
+        """
+        new_board = self.__copy__()
+        new_board.add_move(player, move)
+
+        return new_board
+
+    def push_move(self, player, move):
+        """
+        Add <player>'s <move> in place like add_move, remembering what it
+        changed so pop_move can take it back.
+        """
+        saved = (player, move, self.occupied[:], self.illegal[:], self.connected[:], self.scores[player])
+        tiles = self.add_move(player, move)
+        self._undo.append(saved)
+        return tiles
+
+    def pop_move(self):
+        """
+        Take back the last move added with push_move and return it.
+        """
+        (player, move, self.occupied, self.illegal, self.connected, score) = self._undo.pop()
+        self.scores[player] = score
+        self.pieces[player, move.piece_index] = True
+        self.zobrist = zobrist_after(self, player, move)  # XOR-ing the move again takes it out
+        if self.symmetries:
+            self.symmetric_zobrists = symmetric_zobrists_after(self, player, move)
+        return move
+
+    def get_anchors(self, player):
+        """
+        Returns the (x, y) cells that are both connected and legal for <player>.
+        """
+        anchors = []
+        bits = self.connected[player] & ~self.illegal[player]
+        while bits:
+            low = bits & -bits
+            cell = low.bit_length() - 1
+            anchors.append((cell % self.board_w, cell // self.board_w))
+            bits ^= low
+        return anchors
+
+    def get_legal_moves(self, player):
+        """
+        Returns a list of legal moves for given player for this board state,
+        in the same order as Board.get_legal_moves
+        """
+        illegal = self.illegal[player]
+        board_w = self.board_w
+        pieces = self.piece_list.pieces
+        table = self.piece_list.orientations
+
+        move_list = []
+        for (piece_id, x, y, orientation_id) in anchored_placements(table, self.pieces[player],
+                                                                    self.get_anchors(player), board_w, self.board_h):
+            if not (self._orientations[piece_id][orientation_id] << (y * board_w + x)) & illegal:
+                move_list.append(Move(pieces[piece_id], piece_id, table[piece_id][orientation_id].cells,
+                                      x, y, orientation_id))
+        return move_list
+
+    def update_legal_moves(self, player, moves, anchors):
+        """
+        Returns (legal moves, anchors) for <player> from the legal <moves> and
+        <anchors> of an earlier state of this board, like
+        Board.update_legal_moves.
+        """
+        illegal = self.illegal[player]
+        available = self.pieces[player]
+        board_w = self.board_w
+        masks = self._orientations
+        move_list = [move for move in moves if available[move.piece_index] and
+                     not (masks[move.piece_index][move.orientation_id] << (move.y * board_w + move.x)) & illegal]
+
+        current = set(self.get_anchors(player))
+        new_anchors = current - anchors
+        if new_anchors:
+            pieces = self.piece_list.pieces
+            table = self.piece_list.orientations
+            known = {(move.piece_index, move.x, move.y, move.orientation_id) for move in move_list}
+            for placement in anchored_placements(table, available, new_anchors, board_w, self.board_h):
+                (piece_id, x, y, orientation_id) = placement
+                if placement not in known and not (masks[piece_id][orientation_id] << (y * board_w + x)) & illegal:
+                    move_list.append(Move(pieces[piece_id], piece_id, table[piece_id][orientation_id].cells,
+                                          x, y, orientation_id))
+        return move_list, current
+
+    def check_move_valid(self, player, move):
+        """
+        Check if <player> can legally perform <move>.
+
+        For a move to be valid, it must:
+        - Use a piece that is available
+        - Be completely in bounds
+        - Not be intersecting any other tiles
+        - Not be adjacent to any of the player's other pieces
+        - Be diagonally attached to one of the player's pieces or their corner
+
+        Return True if the move is legal or False otherwise.
+        """
+        if not self.pieces[player, move.piece_index]:
+            # piece has already been used
+            return False
+
+        mask = self.move_mask(move)
+        if mask is None:
+            return False
+        return not mask & self.illegal[player] and bool(mask & self.connected[player])
+
+    def check_tile_legal(self, player, x, y):
+        """
+        Check if it's legal for <player> to place one tile at (<x>, <y>).
+
+        Returns True if legal or False if not.
+        """
+        if x < 0 or x >= self.board_w or y < 0 or y >= self.board_h:
+            return False
+        return not self.illegal[player] & self._bit(x, y)
+
+    def check_tile_attached(self, player, x, y):
+        """Check if (<x>, <y>) is diagonally attached to <player>'s moves.
+
+        Note that this does not check if this move is legal.
+
+        Returns True if attached or False if not.
+        """
+        if x < 0 or x >= self.board_w or y < 0 or y >= self.board_h:
+            return False
+        return bool(self.connected[player] & self._bit(x, y))
+
+    def _to_array(self, bits):
+        """
+        Unpacks bitboard <bits> into a (board_h x board_w) boolean array.
+        """
+        num_cells = self.board_w * self.board_h
+        raw = np.frombuffer(bits.to_bytes((num_cells + 7) // 8, 'little'), np.uint8)
+        return np.unpackbits(raw, bitorder='little')[:num_cells].astype(np.bool_).reshape(self.board_h, self.board_w)
+
+    def _from_array(self, array):
+        """
+        Packs the (board_h x board_w) boolean <array> into a bitboard.
+        """
+        return int.from_bytes(np.packbits(np.asarray(array, np.bool_).ravel(), bitorder='little').tobytes(), 'little')
+
+    def legal_mask(self, player):
+        """
+        Returns a (board_h x board_w) boolean array of the cells <player> may
+        place a tile on.
+        """
+        return self._to_array(~self.illegal[player] & self._full)
+
+    def anchor_mask(self, player):
+        """
+        Returns a (board_h x board_w) boolean array of <player>'s anchors.
+        """
+        return self._to_array(self.connected[player] & ~self.illegal[player])
+
+    def available_pieces(self, player):
+        """
+        Returns a boolean array telling which pieces <player> can still use.
+        """
+        return self.pieces[player]
+
+    def get_position(self, x, y):
+        bit = self._bit(x, y)
+        for p in range(self.num_players):
+            if self.occupied[p] & bit:
+                return p
+        return -1
+
+    @property
+    def state(self):
+        """
+        The board as the 2D array Board.state would hold (-1 = free; 0-3 =
+        player x's tile). Built on demand, so only use it for display.
+        """
+        state = np.full((self.board_h, self.board_w), -1, np.int8)
+        for p in range(self.num_players):
+            bits = self.occupied[p]
+            while bits:
+                low = bits & -bits
+                cell = low.bit_length() - 1
+                state[cell // self.board_w, cell % self.board_w] = p
+                bits ^= low
+        return state
+
+    def score(self, player):
+        return self.scores[player]
+
+    def __eq__(self, other):
+        if hash(self) != hash(other):
+            return False
+        if not np.array_equal(self.pieces, other.pieces):
+            return False
+        if self.symmetries:
+            return symmetric_equal(self.state, other.state, self.symmetries)
+        return self.occupied == other.occupied
+
+    def __hash__(self):
+        if self.symmetric_zobrists:
+            return min(self.zobrist, *self.symmetric_zobrists)
+        return self.zobrist
+
+    def __str__(self):
+        out_str = []
+        for row in range(self.board_h):
+            for col in range(self.board_w):
+                position = self.get_position(col, row)
+                if position == -1:
+                    out_str.append('_')
+                else:
+                    out_str.append(str(position))
+            out_str.append('\n')
+        return ''.join(out_str)
+
+    def key(self):
+        """
+        Returns an immutable snapshot of this board, equal for equal boards.
+        """
+        if self.symmetries:
+            return symmetric_key(self.state, self.symmetries), self.pieces.tobytes()
+        return tuple(self.occupied), self.pieces.tobytes()
+
+    def __copy__(self):
+        cpy_board = BitBoard.__new__(BitBoard)
+        cpy_board.__dict__.update(self.__dict__)
+        cpy_board._undo = []
+        cpy_board.occupied = self.occupied[:]
+        cpy_board.illegal = self.illegal[:]
+        cpy_board.connected = self.connected[:]
+        cpy_board.pieces = np.copy(self.pieces)
+        cpy_board.scores = self.scores[:]
+        return cpy_board
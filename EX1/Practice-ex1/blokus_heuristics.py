@@ -0,0 +1,112 @@
+"""
+Reachability heuristics for the Blokus corners and cover problems.
+
+Every tile a player adds is connected to their earlier tiles: tiles of one
+piece share edges and pieces touch corners. So covering a target takes at
+least as many new tiles as there are cells on the shortest king-move path of
+legal cells from one of the player's anchors to it. The distance maps are
+computed with a BFS over the whole board at once in NumPy.
+"""
+
+import math
+
+import numpy as np
+
+from blokus_problems import blokus_corners_heuristic, blokus_cover_heuristic
+
+
+def distance_map(sources, passable, stop_at=None):
+    """
+    Returns a float array holding, for every cell, the number of king moves
+    through <passable> cells from the nearest <sources> cell (np.inf if there
+    is no such path). Both arguments are (board_h x board_w) boolean arrays.
+
+    If a boolean array <stop_at> is given, the search stops as soon as all of
+    its passable cells are reached; farther cells are left at np.inf.
+    """
+    (board_h, board_w) = passable.shape
+    distances = np.full(passable.shape, np.inf)
+    reached = sources & passable
+    distances[reached] = 0
+    if stop_at is not None:
+        stop_at = stop_at & passable
+    frontier = reached
+    # Grown frontiers are built inside a zero border so no slice falls off the board
+    padded = np.zeros((board_h + 2, board_w + 2), np.bool_)
+    rows = np.zeros((board_h + 2, board_w), np.bool_)
+    steps = 0
+    while frontier.any():
+        if stop_at is not None and not (stop_at & ~reached).any():
+            break
+        steps += 1
+        # The 8-neighbourhood is a 3-wide row dilation followed by a 3-high column one
+        padded[1:-1, 1:-1] = frontier
+        np.logical_or(padded[:, :-2], padded[:, 2:], out=rows)
+        rows |= padded[:, 1:-1]
+        grown = rows[:-2] | rows[1:-1] | rows[2:]
+        frontier = grown & passable & ~reached
+        distances[frontier] = steps
+        reached |= frontier
+    return distances
+
+
+def reachability_bound(state, positions):
+    """
+    A lower bound on the number of tiles player 0 must still place to cover
+    every (row, col) in <positions> on <state>.
+
+    c(t), the cells from the nearest anchor to target t, bounds each target
+    on its own. For two targets, whatever tiles cover both form a tree
+    joining the anchors, t1 and t2, which needs at least
+    (c(t1) + c(t2) + d(t1, t2)) / 2 cells, where d(t1, t2) is the shorter of
+    the legal path between the targets and going through the anchors. The
+    bound is the largest of all of these, or math.inf if a target can no
+    longer be reached.
+    """
+    uncovered = [(row, col) for (row, col) in positions if state.get_position(col, row) != 0]
+    if not uncovered:
+        return 0
+
+    legal = state.legal_mask(0)
+    targets = np.zeros(legal.shape, np.bool_)
+    for position in uncovered:
+        targets[position] = True
+    from_anchors = distance_map(state.anchor_mask(0), legal, targets)
+    cells = [from_anchors[row, col] + 1 for (row, col) in uncovered]
+    bound = max(cells)
+    if bound == np.inf:
+        return math.inf
+
+    for i in range(len(uncovered) - 1):
+        target = np.zeros(legal.shape, np.bool_)
+        target[uncovered[i]] = True
+        targets[uncovered[i]] = False
+        from_target = distance_map(target, legal, targets)
+        for j in range(i + 1, len(uncovered)):
+            between = min(from_target[uncovered[j]], cells[i] + cells[j])
+            bound = max(bound, math.ceil((cells[i] + cells[j] + between) / 2))
+    return int(bound)
+
+
+def blokus_corners_reachability_heuristic(state, problem):
+    """
+    The larger of blokus_corners_heuristic and the reachability bound for the
+    corners, memoized in problem.heuristic_cache.
+    """
+    value = problem.heuristic_cache.get(state, 'reachability')
+    if value is None:
+        value = max(blokus_corners_heuristic(state, problem), reachability_bound(state, problem.corner_positions))
+        problem.heuristic_cache.put(state, value, 'reachability')
+    return value
+
+
+def blokus_cover_reachability_heuristic(state, problem):
+    """
+    The larger of blokus_cover_heuristic and the reachability bound for the
+    targets, memoized in problem.heuristic_cache.
+    """
+    value = problem.heuristic_cache.get(state, 'reachability')
+    if value is None:
+        value = max(blokus_cover_heuristic(state, problem), reachability_bound(state, problem.targets))
+        problem.heuristic_cache.put(state, value, 'reachability')
+    return value
@@ -1,28 +1,102 @@
+from collections import OrderedDict
 from itertools import combinations
 
-from board import Board
-from search import SearchProblem
+import numpy as np
+
+from board import Board, BoardDelta, Move, board_symmetries, orientation_kernels
+from bitboard import BitBoard
+from search import SearchProblem, SearchStats, beam_search
 import util
 import math
+import time
+
+# Board engines a problem can be built on; both expose the same API
+BOARD_ENGINES = {'array': Board, 'bitboard': BitBoard}
+
+
+class HeuristicCache:
+    """
+    A bounded LRU memo of heuristic values keyed by board hash, holding the
+    per-problem numbers the corners/cover heuristics need:
+    - piece_sizes: the number of tiles of each piece, by piece index
+    - positions: the corners or targets to cover
+    - position_distances: the Manhattan distance between every two positions
+    - hits/misses: how many lookups were / were not answered from the memo
+    """
+
+    def __init__(self, piece_list, positions, max_size=100000):
+        self.piece_sizes = np.array([piece.get_num_tiles() for piece in piece_list], np.int64)
+        self.positions = list(positions)
+        self.position_distances = np.array([[util.manhattanDistance(a, b) for b in self.positions]
+                                            for a in self.positions], np.int64)
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._values = OrderedDict()
+
+    def get(self, state, kind=None):
+        """
+        Returns the memoized value for <state>, or None. Heuristics sharing a
+        cache tell their values apart by <kind>.
+        """
+        key = hash(state) if kind is None else (kind, hash(state))
+        if key in self._values:
+            self._values.move_to_end(key)
+            self.hits += 1
+            return self._values[key]
+        self.misses += 1
+        return None
+
+    def put(self, state, value, kind=None):
+        self._values[hash(state) if kind is None else (kind, hash(state))] = value
+        if len(self._values) > self.max_size:
+            self._values.popitem(last=False)
+
+    def min_position_distance(self):
+        """
+        Returns the smallest distance between two different positions.
+        """
+        if len(self.positions) < 2:
+            return math.inf
+        return int(self.position_distances[~np.eye(len(self.positions), dtype=np.bool_)].min())
+
+    def smallest_remaining_piece_size(self, state):
+        """
+        Returns the tile count of the smallest piece player 0 can still use.
+        """
+        sizes = self.piece_sizes[state.available_pieces(0)]
+        return int(sizes.min()) if sizes.size else math.inf
+
+    def __str__(self):
+        return "Heuristic cache: %d hits, %d misses, %d entries" % (self.hits, self.misses, len(self._values))
 
 
 def calculate_generic_heuristic(state, problem, positions, dimension_factor):
     """
     Generic heuristic calculation function for both corners and cover problems.
+
+    Values are memoized in problem.heuristic_cache, and only the pieces still
+    available on <state> count towards the smallest piece size.
     """
-    uncovered_positions = count_uncovered_positions(state, positions)
-    smallest_piece_size = find_smallest_piece_size(problem.piece_list.pieces)
-    adjustment_factor = min(smallest_piece_size, (dimension_factor + 1) / 2.0)
-    return adjustment_factor * uncovered_positions
+    value = problem.heuristic_cache.get(state)
+    if value is None:
+        uncovered_positions = count_uncovered_positions(state, positions)
+        if uncovered_positions == 0:
+            value = 0
+        else:
+            smallest_piece_size = problem.heuristic_cache.smallest_remaining_piece_size(state)
+            adjustment_factor = min(smallest_piece_size, (dimension_factor + 1) / 2.0)
+            value = adjustment_factor * uncovered_positions
+        problem.heuristic_cache.put(state, value)
+    return value
 
 def count_uncovered_positions(state, positions):
     """
     Count the number of uncovered positions (either corners or targets) on the board.
     """
-    board_state = state.state
     uncovered = 0
     for pos_x, pos_y in positions:
-        if board_state[pos_x][pos_y] == 0:  # this position is not covered
+        if state.get_position(pos_y, pos_x) == 0:  # this position is not covered
             continue
         uncovered += 1
     return uncovered
@@ -39,22 +113,125 @@ def find_smallest_piece_size(pieces):
 
 
 
-class BlokusFillProblem(SearchProblem):
+class BlokusProblem(SearchProblem):
     """
-    A one-player Blokus game as a search problem.
-    This problem is implemented for you. You should NOT change it!
+    Shared plumbing for the one-player Blokus search problems.
+
+    With lazy_successors, get_successors yields BoardDelta records instead of
+    copying the board for every legal move; a successor's board is only built
+    once the search actually looks at it. The get_actions / apply_action /
+    undo_action / get_state_key methods let search.depth_first_search_undo
+    walk the tree on a single board, get_state_after lets
+    search.parallel_a_star_search send plans instead of boards, and
+    get_signature / encode_action / decode_action let searches keep results
+    in a transposition.TranspositionTable.
+
+    With symmetry, boards that are mirror images (or turns) of each other
+    under a symmetry of the puzzle hash and compare equal, so every search
+    keeps and expands one board per symmetry class. Plans are unaffected:
+    they are played on the boards the search actually reached.
     """
 
-    def __init__(self, board_w, board_h, piece_list, starting_point=(0, 0)):
-        self.board = Board(board_w, board_h, 1, piece_list, starting_point)
+    def __init__(self, board_w, board_h, piece_list, starting_point=(0, 0), engine='array',
+                 lazy_successors=False):
+        self.board = BOARD_ENGINES[engine](board_w, board_h, 1, piece_list, starting_point)
+        self.piece_list = piece_list
+        self.starting_point = tuple(starting_point)
+        self.lazy_successors = lazy_successors
+        self.symmetry = False
         self.expanded = 0
 
+    def set_symmetry(self, symmetry, fixed_positions=()):
+        """
+        Turns symmetry reduction on or off. The symmetries used are those of
+        the board that keep the starting point in place and map the (row, col)
+        <fixed_positions> the goal depends on onto themselves.
+        """
+        self.symmetry = symmetry
+        symmetries = ()
+        if symmetry:
+            symmetries = board_symmetries(self.board.board_w, self.board.board_h, self.starting_point,
+                                          fixed_positions)
+        self.board.set_symmetries(symmetries)
+
     def get_start_state(self):
         """
         Returns the start state for the search problem
         """
         return self.board
 
+    def get_successor(self, state, move):
+        """
+        Returns the board reached by playing <move> on <state>.
+        """
+        if self.lazy_successors:
+            return BoardDelta(state, 0, move)
+        return state.do_move(0, move)
+
+    def get_actions(self, state):
+        """
+        Returns the legal moves from <state>, counting it as expanded.
+        """
+        self.expanded = self.expanded + 1
+        return state.get_legal_moves(0)
+
+    def apply_action(self, state, action):
+        state.push_move(0, action)
+
+    def undo_action(self, state, action):
+        state.pop_move()
+
+    def get_state_key(self, state):
+        return state.key()
+
+    def get_state_after(self, actions):
+        """
+        Returns a new board with <actions> played from the start state.
+        """
+        state = self.board.__copy__()
+        for action in actions:
+            state.add_move(0, action)
+        return state
+
+    def get_signature(self):
+        """
+        Returns a value that is equal for two problems iff they are the same
+        puzzle: the same kind of problem, board, start, pieces and goal.
+        """
+        pieces = tuple(tuple(sorted(piece_orientations[0].tiles))
+                       for piece_orientations in self.piece_list.orientations)
+        return (self.__class__.__name__, self.board.board_w, self.board.board_h, self.starting_point, pieces,
+                self.get_goal_signature())
+
+    def get_goal_signature(self):
+        """
+        The part of get_signature describing the goal, beyond the board.
+        """
+        return ()
+
+    def encode_action(self, move):
+        """
+        Returns <move> as a tuple of 4 small integers, undone by decode_action.
+        """
+        return move.piece_index, move.orientation_id, move.x, move.y
+
+    def decode_action(self, code):
+        (piece_id, orientation_id, x, y) = code
+        return Move(self.piece_list.pieces[piece_id], piece_id,
+                    self.piece_list.orientations[piece_id][orientation_id].cells, x, y, orientation_id)
+
+
+class BlokusFillProblem(BlokusProblem):
+    """
+    A one-player Blokus game as a search problem.
+    This problem is implemented for you. You should NOT change it!
+    """
+
+    def __init__(self, board_w, board_h, piece_list, starting_point=(0, 0), engine='array',
+                 lazy_successors=False, symmetry=False):
+        super().__init__(board_w, board_h, piece_list, starting_point, engine, lazy_successors)
+        self.set_symmetry(symmetry)
+
     def is_goal_state(self, state):
         """
         state: Search state
@@ -74,7 +251,7 @@ class BlokusFillProblem(SearchProblem):
         """
         # Note that for the search problem, there is only one player - #0
         self.expanded = self.expanded + 1
-        return [(state.do_move(0, move), move, 1) for move in state.get_legal_moves(0)]
+        return [(self.get_successor(state, move), move, 1) for move in state.get_legal_moves(0)]
 
     def get_cost_of_actions(self, actions):
         """
@@ -89,24 +266,19 @@ class BlokusFillProblem(SearchProblem):
 #####################################################
 # This portion is incomplete.  Time to write code!  #
 #####################################################
-class BlokusCornersProblem(SearchProblem):
-    def __init__(self, board_w, board_h, piece_list, starting_point=(0, 0)):
-        self.expanded = 0
+class BlokusCornersProblem(BlokusProblem):
+    def __init__(self, board_w, board_h, piece_list, starting_point=(0, 0), engine='array',
+                 lazy_successors=False, symmetry=False):
+        super().__init__(board_w, board_h, piece_list, starting_point, engine, lazy_successors)
         self.expansion_count = 0
-        self.board = Board(board_w, board_h, 1, piece_list, starting_point)
         self.corner_positions = [(0, 0), (board_h - 1, 0), (0, board_w - 1), (board_h - 1, board_w - 1)]
-        self.piece_list = piece_list
-
-    def get_start_state(self):
-        """
-        Returns the start state for the search problem
-        """
-        return self.board
+        self.heuristic_cache = HeuristicCache(piece_list, self.corner_positions)
+        self.set_symmetry(symmetry, self.corner_positions)
 
     def is_goal_state(self, state):
         corners = self.corner_positions
         for corner in corners:
-            if state.state[corner[0]][corner[1]] == -1:
+            if state.get_position(corner[1], corner[0]) == -1:
                 return False
         return True
 
@@ -122,7 +294,8 @@ class BlokusCornersProblem(SearchProblem):
         """
         # Note that for the search problem, there is only one player - #0
         self.expanded = self.expanded + 1
-        return [(state.do_move(0, move), move, move.piece.get_num_tiles()) for move in state.get_legal_moves(0)]
+        return [(self.get_successor(state, move), move, move.piece.get_num_tiles())
+                for move in state.get_legal_moves(0)]
 
     def get_cost_of_actions(self, actions):
         """
@@ -153,27 +326,24 @@ def blokus_corners_heuristic(state, problem):
 
 
 
-class BlokusCoverProblem(SearchProblem):
-    def __init__(self, board_w, board_h, piece_list, starting_point=(0, 0), targets=[(0, 0)]):
+class BlokusCoverProblem(BlokusProblem):
+    def __init__(self, board_w, board_h, piece_list, starting_point=(0, 0), targets=[(0, 0)], engine='array',
+                 lazy_successors=False, symmetry=False):
+        super().__init__(board_w, board_h, piece_list, starting_point, engine, lazy_successors)
         self.targets = targets.copy()
-        self.expanded = 0
-        self.board = Board(board_w, board_h, 1, piece_list, starting_point)
-        self.piece_list = piece_list
+        self.heuristic_cache = HeuristicCache(piece_list, self.targets)
+        self.set_symmetry(symmetry, self.targets)
 
         self.min_target_distance = self.calculate_min_target_distance()
 
+    def get_goal_signature(self):
+        return tuple(sorted(tuple(target) for target in self.targets))
+
     def calculate_min_target_distance(self):
         """
         Calculate the minimum Manhattan distance between any two targets.
         """
-        min_distance = math.inf
-        num_targets = len(self.targets)
-        for i in range(num_targets):
-            for j in range(i + 1, num_targets):
-                distance = self.manhattan_distance(self.targets[i], self.targets[j])
-                if distance < min_distance:
-                    min_distance = distance
-        return min_distance
+        return self.heuristic_cache.min_position_distance()
 
     @staticmethod
     def manhattan_distance(point1, point2):
@@ -182,16 +352,10 @@ class BlokusCoverProblem(SearchProblem):
         """
         return abs(point1[0] - point2[0]) + abs(point1[1] - point2[1])
 
-    def get_start_state(self):
-        """
-        Returns the start state for the search problem
-        """
-        return self.board
-
     def is_goal_state(self, state):
         targets = self.targets
         for target in targets:
-            if state.state[target[0]][target[1]] == -1:
+            if state.get_position(target[1], target[0]) == -1:
                 return False
         return True
 
@@ -207,7 +371,8 @@ class BlokusCoverProblem(SearchProblem):
         """
         # Note that for the search problem, there is only one player - #0
         self.expanded = self.expanded + 1
-        return [(state.do_move(0, move), move, move.piece.get_num_tiles()) for move in state.get_legal_moves(0)]
+        return [(self.get_successor(state, move), move, move.piece.get_num_tiles())
+                for move in state.get_legal_moves(0)]
 
     def get_cost_of_actions(self, actions):
         """
@@ -232,3 +397,177 @@ def blokus_cover_heuristic(state, problem):
         target.
         """
     return calculate_generic_heuristic(state, problem, problem.targets, problem.min_target_distance)
+
+
+class ClosestLocationSearch:
+    """
+    In this problem you have to cover all given positions on the board,
+    but the objective is speed, not optimality.
+
+    solve() is an anytime solver. It first builds a plan greedily, always
+    heading for the closest uncovered target, then spends what is left of
+    <time_limit> seconds on beam searches of growing width looking for a
+    cheaper plan, and returns the best plan found when time runs out.
+    """
+
+    def __init__(self, board_w, board_h, piece_list, starting_point=(0, 0), targets=((0, 0),), engine='array',
+                 time_limit=1.0):
+        self.expanded = 0
+        self.targets = list(targets)
+        self.cover_problem = BlokusCoverProblem(board_w, board_h, piece_list, starting_point, self.targets, engine)
+        self.board = self.cover_problem.board
+        self.piece_list = piece_list
+        self.time_limit = time_limit
+
+    def get_start_state(self):
+        """
+        Returns the start state for the search problem
+        """
+        return self.board
+
+    def solve(self):
+        """
+        Returns a sequence of actions that covers all target locations on the
+        board (or [] if none was found in time).
+        """
+        deadline = time.time() + self.time_limit
+        back_trace = self.greedy_plan(deadline)
+        back_trace = self.refine(back_trace, deadline)
+        self.expanded += self.cover_problem.expanded
+        return back_trace if back_trace is not None else []
+
+    def uncovered_targets(self, state):
+        return [target for target in self.targets if state.get_position(target[1], target[0]) != 0]
+
+    def greedy_plan(self, deadline=math.inf):
+        """
+        Cover one target at a time, each time heading for the uncovered target
+        closest to the placed tiles. Every step plays the move with the fewest
+        tiles plus cells left to that target among the moves that cover it or
+        bring it closer, ruling out moves that strand a target (see
+        is_stranded). If no move helps with the closest target, the next
+        closest is tried. Returns None if it gets stuck or <deadline> passes.
+        """
+        from blokus_heuristics import distance_map
+
+        state = self.board.__copy__()
+        back_trace = []
+        while True:
+            uncovered = self.uncovered_targets(state)
+            if not uncovered:
+                return back_trace
+            distances = self.target_distances(state, uncovered, distance_map)
+            self.expanded += 1
+            moves = state.get_legal_moves(0)
+            best_move = None
+            for target in sorted(uncovered, key=lambda t: distances[t]):
+                if distances[target] == math.inf:
+                    return None
+                best_move = self.greedy_move(state, moves, target, distances[target], deadline, distance_map)
+                if best_move is not None:
+                    break
+            if best_move is None:
+                return None
+            state.add_move(0, best_move)
+            back_trace.append(best_move)
+
+    def greedy_move(self, state, moves, target, distance, deadline, distance_map):
+        """
+        Returns the best of <moves> on <state> for greedy_plan that covers
+        <target> or brings it closer than <distance> cells, or None.
+        """
+        (row, col) = target
+        scored = []
+        for move in moves:
+            if time.time() >= deadline:
+                return None
+            # The new anchors touch the move's tiles, so a move whose tiles are
+            # all at least <distance> king moves away cannot bring it closer
+            if min(max(abs(move.y + y - row), abs(move.x + x - col)) for (x, y) in move.orientation) >= distance:
+                continue
+            next_state = state.do_move(0, move)
+            left = self.uncovered_targets(next_state)
+            next_distances = self.target_distances(next_state, left, distance_map)
+            if next_distances.get(target, 0) >= distance:
+                continue
+            score = (move.piece.get_num_tiles() + next_distances.get(target, 0), sum(next_distances.values()))
+            scored.append((score, len(scored), move, next_state, left, next_distances))
+        for (_, _, move, next_state, left, next_distances) in sorted(scored, key=lambda entry: entry[:2]):
+            if not self.is_stranded(next_state, left, next_distances):
+                return move
+        return None
+
+    def is_stranded(self, state, targets, distances):
+        """
+        Returns true if one of the uncovered <targets> can no longer be
+        covered on <state>: there is no legal path to it, the pieces left have
+        fewer tiles than the cells on that path, or none of them fits on legal
+        cells over it.
+        """
+        if not targets:
+            return False
+        (kernels, piece_ids, _, size) = orientation_kernels(self.piece_list)
+        available = np.asarray(state.available_pieces(0), np.bool_)
+        tiles_left = sum(self.piece_list.get_piece(i).get_num_tiles() for i in np.flatnonzero(available))
+        if max(distances[target] for target in targets) > tiles_left:
+            return True
+
+        # Orientation kernels of the pieces left, against every size x size
+        # window of the board that holds the target (off the board is illegal)
+        kernels = kernels[:, available[piece_ids]]
+        illegal = np.ones((state.board_h + 2 * (size - 1), state.board_w + 2 * (size - 1)), np.bool_)
+        illegal[size - 1:size - 1 + state.board_h, size - 1:size - 1 + state.board_w] = ~state.legal_mask(0)
+        for (row, col) in targets:
+            windows = np.lib.stride_tricks.sliding_window_view(illegal[row:row + 2 * size - 1, col:col + 2 * size - 1],
+                                                               (size, size))
+            clashes = windows.reshape(size * size, size * size).astype(np.float32) @ kernels
+            # Window i (row-major) has the target at cell size * size - 1 - i
+            if not ((clashes == 0) & (kernels[::-1] > 0)).any():
+                return True
+        return False
+
+    @staticmethod
+    def target_distances(state, targets, distance_map):
+        """
+        Returns {target: cells on the shortest legal path from an anchor}.
+        """
+        if not targets:
+            return {}
+        legal = state.legal_mask(0)
+        stop_at = np.zeros(legal.shape, np.bool_)
+        for target in targets:
+            stop_at[target] = True
+        distances = distance_map(state.anchor_mask(0), legal, stop_at)
+        return {target: distances[target] + 1 for target in targets}
+
+    def refine(self, back_trace, deadline):
+        """
+        Run beam searches of width 1, 2, 4, ... until <deadline>, each looking
+        for a plan cheaper than the best so far, and return the cheapest plan.
+        Stops early once a beam search proves nothing cheaper exists.
+        """
+        from blokus_heuristics import blokus_cover_reachability_heuristic as heuristic
+
+        best_cost = math.inf if back_trace is None else self.cover_problem.get_cost_of_actions(back_trace)
+        width = 1
+        while time.time() < deadline:
+            stats = SearchStats()
+            plan = beam_search(self.cover_problem, heuristic, width, stats, bound=best_cost, deadline=deadline)
+            if plan:
+                (back_trace, best_cost) = (plan, self.cover_problem.get_cost_of_actions(plan))
+            if stats.lower_bound >= best_cost:
+                break
+            width *= 2
+        return back_trace
+
+
+class MiniContestSearch(ClosestLocationSearch):
+    """
+    The contest entry: the same anytime solver as ClosestLocationSearch, but
+    with a longer default time budget so the beam refinement gets to widths
+    that find cheap plans.
+    """
+
+    def __init__(self, board_w, board_h, piece_list, starting_point=(0, 0), targets=((0, 0),), engine='array',
+                 time_limit=10.0):
+        super().__init__(board_w, board_h, piece_list, starting_point, targets, engine, time_limit)
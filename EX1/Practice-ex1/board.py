@@ -1,5 +1,194 @@
+import random
+
 import numpy as np
 
+# Zobrist keys are shared by every board of the same shape, and seeded so a
+# board hashes the same way in every run
+_ZOBRIST_SEED = 67842
+_zobrist_tables = {}
+# PieceList.orientations tables as matrices, for Board.get_legal_moves_vectorized
+_orientation_kernels = {}
+
+
+def zobrist_table(num_players, board_w, board_h, num_pieces):
+    """
+    Returns (cell_keys, piece_keys) for boards of this shape:
+    cell_keys[player][y * board_w + x] is the key of <player> owning (x, y),
+    piece_keys[player][piece_index] the key of <player> having used the piece.
+    """
+    shape = (num_players, board_w, board_h, num_pieces)
+    if shape not in _zobrist_tables:
+        rand = random.Random(hash(shape) ^ _ZOBRIST_SEED)
+        cell_keys = [[rand.getrandbits(64) for _ in range(board_w * board_h)] for _ in range(num_players)]
+        piece_keys = [[rand.getrandbits(64) for _ in range(num_pieces)] for _ in range(num_players)]
+        _zobrist_tables[shape] = (cell_keys, piece_keys)
+    return _zobrist_tables[shape]
+
+
+def zobrist_after(board, player, move):
+    """
+    Returns the Zobrist hash <board> would have after <player> plays <move>,
+    without checking that the move is legal.
+    """
+    (cell_keys, piece_keys) = board._zobrist_keys
+    player_cells = cell_keys[player]
+    h = board.zobrist ^ piece_keys[player][move.piece_index]
+    for (xi, yi) in move.orientation:
+        h ^= player_cells[(yi + move.y) * board.board_w + xi + move.x]
+    return h
+
+
+def board_symmetries(board_w, board_h, starting_point=(0, 0), fixed_positions=()):
+    """
+    Returns the symmetries of a board_w x board_h board that keep the (row,
+    col) <starting_point> in place and map the set of (row, col)
+    <fixed_positions> onto itself, leaving out the identity.
+
+    A symmetry is a tuple cell_map: cell_map[y * board_w + x] is the cell
+    that (x, y) is mapped to. Rectangular boards have the mirror images and
+    the half turn; square ones also the quarter turns and the diagonal
+    mirror images.
+    """
+    (w, h) = (board_w, board_h)
+    transforms = [lambda x, y: (w - 1 - x, y), lambda x, y: (x, h - 1 - y), lambda x, y: (w - 1 - x, h - 1 - y)]
+    if w == h:
+        transforms += [lambda x, y: (y, x), lambda x, y: (h - 1 - y, w - 1 - x),
+                       lambda x, y: (h - 1 - y, x), lambda x, y: (y, w - 1 - x)]
+
+    fixed = {(col, row) for (row, col) in fixed_positions}
+    (start_y, start_x) = starting_point
+    symmetries = []
+    for transform in transforms:
+        if transform(start_x, start_y) != (start_x, start_y):
+            continue
+        if {transform(x, y) for (x, y) in fixed} != fixed:
+            continue
+        cell_map = []
+        for y in range(h):
+            for x in range(w):
+                (tx, ty) = transform(x, y)
+                cell_map.append(ty * w + tx)
+        symmetries.append(tuple(cell_map))
+    return symmetries
+
+
+def symmetric_zobrists(board):
+    """
+    Returns, for each of <board>'s symmetries, the Zobrist hash of the board's
+    image under it, computed from scratch.
+    """
+    (cell_keys, piece_keys) = board._zobrist_keys
+    used = 0
+    for player in range(board.num_players):
+        for (piece_index, available) in enumerate(board.available_pieces(player)):
+            if not available:
+                used ^= piece_keys[player][piece_index]
+    cells = [(y * board.board_w + x, board.get_position(x, y))
+             for y in range(board.board_h) for x in range(board.board_w)]
+    cells = [(cell, int(owner)) for (cell, owner) in cells if owner != -1]
+    hashes = []
+    for cell_map in board.symmetries:
+        h = used
+        for (cell, owner) in cells:
+            h ^= cell_keys[owner][cell_map[cell]]
+        hashes.append(h)
+    return tuple(hashes)
+
+
+def symmetric_zobrists_after(board, player, move):
+    """
+    Like zobrist_after, for the hashes of <board>'s images under each of its
+    symmetries.
+    """
+    (cell_keys, piece_keys) = board._zobrist_keys
+    player_cells = cell_keys[player]
+    piece_key = piece_keys[player][move.piece_index]
+    cells = [(yi + move.y) * board.board_w + xi + move.x for (xi, yi) in move.orientation]
+    hashes = []
+    for (cell_map, h) in zip(board.symmetries, board.symmetric_zobrists):
+        h ^= piece_key
+        for cell in cells:
+            h ^= player_cells[cell_map[cell]]
+        hashes.append(h)
+    return tuple(hashes)
+
+
+def symmetric_equal(state, other_state, symmetries):
+    """
+    Returns True iff the (board_h x board_w) arrays <state> and <other_state>
+    are equal, or equal up to one of the <symmetries>.
+    """
+    if np.array_equal(state, other_state):
+        return True
+    flat = state.ravel()
+    other_flat = other_state.ravel()
+    return any(np.array_equal(other_flat[list(cell_map)], flat) for cell_map in symmetries)
+
+
+def symmetric_key(state, symmetries):
+    """
+    Returns the smallest of the bytes of <state> and of its images under the
+    <symmetries>, the same for every board of a symmetry class.
+    """
+    flat = state.ravel()
+    keys = [flat.tobytes()]
+    for cell_map in symmetries:
+        image = np.empty_like(flat)
+        image[list(cell_map)] = flat
+        keys.append(image.tobytes())
+    return min(keys)
+
+
+def orientation_kernels(piece_list):
+    """
+    Returns (kernels, piece_ids, orientation_ids, size) for <piece_list>:
+    column i of the (size * size x num_orientations) float32 array kernels is
+    orientation i's tiles on a size x size grid, flattened row by row, and
+    piece_ids[i] / orientation_ids[i] say which orientation it is.
+    """
+    orientations = piece_list.orientations
+    cached = _orientation_kernels.get(id(orientations))
+    if cached is not None and cached[0] is orientations:
+        return cached[1]
+
+    flat = [ori for piece_orientations in orientations for ori in piece_orientations]
+    size = max(max(ori.width, ori.height) for ori in flat)
+    kernels = np.zeros((size * size, len(flat)), np.float32)
+    for (i, ori) in enumerate(flat):
+        for (x, y) in ori.tiles:
+            kernels[y * size + x, i] = 1
+    piece_ids = np.array([ori.piece_id for ori in flat], np.intp)
+    orientation_ids = np.array([ori.orientation_id for ori in flat], np.intp)
+    result = (kernels, piece_ids, orientation_ids, size)
+    # Keep the table alive so its id cannot be reused by another one
+    _orientation_kernels[id(orientations)] = (orientations, result)
+    return result
+
+
+def anchored_placements(orientations, available, anchors, board_w, board_h):
+    """
+    Returns the (piece_id, x, y, orientation_id) placements that put a tile of
+    an <available> piece on one of the (x, y) <anchors> and stay in bounds.
+    <orientations> is a PieceList.orientations table.
+
+    Placements are de-duplicated and sorted, so callers see them in the same
+    piece, x, y, orientation order a full board scan would produce.
+    """
+    placements = set()
+    for piece_orientations in orientations:
+        if not available[piece_orientations[0].piece_id]:
+            continue
+        for ori in piece_orientations:
+            max_x = board_w - ori.width
+            max_y = board_h - ori.height
+            for (ax, ay) in anchors:
+                for (tx, ty) in ori.tiles:
+                    x = ax - tx
+                    y = ay - ty
+                    if 0 <= x <= max_x and 0 <= y <= max_y:
+                        placements.add((ori.piece_id, x, y, ori.orientation_id))
+    return sorted(placements)
+
 
 class Board:
 
@@ -15,6 +204,14 @@ class Board:
       on another player's piece or adjacent to a player's own piece
     - connected: a 4 x 2D array. _connected[player][y][x] is True iff (x,y) is
       diagonally connected to another one of the player's tiles
+    - anchors: one set of (x,y) per player holding the cells that are both
+      connected and legal. Every legal move covers at least one of them
+    - zobrist: a Zobrist hash of the (cell, owner) pairs and used pieces,
+      updated with every move
+    - symmetries/symmetric_zobrists: the board_symmetries set with
+      set_symmetries, and the Zobrist hash of the board's image under each.
+      A board with symmetries hashes and compares equal to its images, so a
+      search keeps one board per symmetry class
     - piece_list: A PieceList object (probably shared with the game engine) to
       help understand the moves
     """
@@ -30,9 +227,32 @@ class Board:
         self._legal = np.full((num_players, board_h, board_w), True, np.bool_)
 
         self.connected = np.full((num_players, board_h, board_w), False, np.bool_)
-        self.connected[0, starting_point[0], starting_point[1]] = True
+        self.anchors = [set() for _ in range(num_players)]
+        self.set_starting_point(0, starting_point)
         self.piece_list = piece_list
         self.pieces = np.full((num_players, piece_list.get_num_pieces()), True, np.bool_)
+        self._zobrist_keys = zobrist_table(num_players, board_w, board_h, piece_list.get_num_pieces())
+        self.zobrist = 0
+        self.symmetries = ()
+        self.symmetric_zobrists = ()
+        self._undo = []
+
+    def set_starting_point(self, player, starting_point):
+        """
+        Mark (row, col) <starting_point> as a corner <player> may start from.
+        """
+        (y, x) = starting_point
+        self.connected[player, y, x] = True
+        if self._legal[player, y, x]:
+            self.anchors[player].add((x, y))
+
+    def set_symmetries(self, symmetries):
+        """
+        Makes this board (and the boards played from it) equal to its images
+        under the board_symmetries <symmetries>.
+        """
+        self.symmetries = tuple(symmetries)
+        self.symmetric_zobrists = symmetric_zobrists(self)
 
     def add_move(self, player, move):
         """
@@ -48,8 +268,12 @@ class Board:
 
         piece = move.piece
         self.pieces[player, move.piece_index] = False  # mark piece as used
+        self.zobrist = zobrist_after(self, player, move)
+        if self.symmetries:
+            self.symmetric_zobrists = symmetric_zobrists_after(self, player, move)
 
         # Update internal state for each tile
+        diagonals = []
         for (xi, yi) in move.orientation:
             (x, y) = (xi + move.x, yi + move.y)
             self.state[y, x] = player
@@ -71,12 +295,21 @@ class Board:
             # The diagonals are now attached
             if x > 0 and y > 0:
                 self.connected[player, y - 1, x - 1] = True
+                diagonals.append((x - 1, y - 1))
             if x > 0 and y < self.board_h - 1:
                 self.connected[player, y + 1, x - 1] = True
+                diagonals.append((x - 1, y + 1))
             if x < self.board_w - 1 and y < self.board_h - 1:
                 self.connected[player, y + 1, x + 1] = True
+                diagonals.append((x + 1, y + 1))
             if x < self.board_w - 1 and y > 0:
                 self.connected[player, y - 1, x + 1] = True
+                diagonals.append((x + 1, y - 1))
+
+        # Anchors that got covered or blocked are dropped; new legal diagonals join
+        self.anchors[player].update(diagonals)
+        for p in range(self.num_players):
+            self.anchors[p] = {(x, y) for (x, y) in self.anchors[p] if self._legal[p, y, x]}
 
         self.scores[player] += piece.get_num_tiles()
         return piece.get_num_tiles()
@@ -90,23 +323,129 @@ class Board:
 
         return new_board
 
+    def push_move(self, player, move):
+        """
+        Add <player>'s <move> in place like add_move, remembering what it
+        changed so pop_move can take it back.
+
+        Only the cells around the move are saved, not the whole board.
+        """
+        max_x = max(x for (x, _) in move.orientation)
+        max_y = max(y for (_, y) in move.orientation)
+        window = (slice(max(move.y - 1, 0), max(move.y + max_y + 2, 0)),
+                  slice(max(move.x - 1, 0), max(move.x + max_x + 2, 0)))
+        saved = (player, move, window, self.state[window].copy(), self._legal[(slice(None),) + window].copy(),
+                 self.connected[(slice(None),) + window].copy(), [set(anchors) for anchors in self.anchors],
+                 self.scores[player])
+        tiles = self.add_move(player, move)
+        self._undo.append(saved)
+        return tiles
+
+    def pop_move(self):
+        """
+        Take back the last move added with push_move and return it.
+        """
+        (player, move, window, state, legal, connected, anchors, score) = self._undo.pop()
+        self.state[window] = state
+        self._legal[(slice(None),) + window] = legal
+        self.connected[(slice(None),) + window] = connected
+        self.anchors = anchors
+        self.scores[player] = score
+        self.pieces[player, move.piece_index] = True
+        self.zobrist = zobrist_after(self, player, move)  # XOR-ing the move again takes it out
+        if self.symmetries:
+            self.symmetric_zobrists = symmetric_zobrists_after(self, player, move)
+        return move
+
     def get_legal_moves(self, player):
         """
         Returns a list of legal moves for given player for this board state 
+
+        Only placements covering one of the player's anchors are tried.
         """
-        # Generate all legal moves
+        pieces = self.piece_list.pieces
+        table = self.piece_list.orientations
         move_list = []
-        for piece in self.piece_list:
-            for x in range(self.board_w):
-                for y in range(self.board_h):
-                    for ori in piece:
-                        new_move = Move(piece,
-                                        self.piece_list.pieces.index(piece),
-                                        ori, x, y)
-                        if self.check_move_valid(player, new_move):
-                            move_list.append(new_move)
+        for (piece_id, x, y, orientation_id) in anchored_placements(table, self.pieces[player], self.anchors[player],
+                                                                    self.board_w, self.board_h):
+            new_move = Move(pieces[piece_id], piece_id, table[piece_id][orientation_id].cells, x, y, orientation_id)
+            if self.check_move_valid(player, new_move):
+                move_list.append(new_move)
         return move_list
 
+    def get_legal_moves_vectorized(self, player):
+        """
+        Returns the same list as get_legal_moves, in the same order, but tests
+        every placement of every orientation at once with NumPy.
+
+        A placement is legal iff none of its tiles is on a cell the player may
+        not use and at least one is on a connected cell. Every k x k window
+        of the board (cells past the edge count as unusable) is correlated
+        with every orientation's k x k mask by one matrix product per board
+        mask, giving the illegal and the connected tile count of every
+        (window, orientation) pair.
+        """
+        if not self.anchors[player]:
+            return []
+        (kernels, piece_ids, orientation_ids, size) = orientation_kernels(self.piece_list)
+        board_h = self.board_h
+        board_w = self.board_w
+
+        padded = np.ones((board_h + size - 1, board_w + size - 1), np.float32)
+        padded[:board_h, :board_w] = ~self._legal[player]
+        blocked = np.lib.stride_tricks.sliding_window_view(padded, (size, size)).reshape(board_h * board_w, -1)
+        padded[:] = 0
+        padded[:board_h, :board_w] = self.connected[player]
+        connected = np.lib.stride_tricks.sliding_window_view(padded, (size, size)).reshape(board_h * board_w, -1)
+
+        valid = (connected @ kernels > 0.5) & (blocked @ kernels < 0.5)
+        valid &= self.pieces[player][piece_ids]
+        (cells, orientations) = np.nonzero(valid)
+        (ys, xs) = np.divmod(cells, board_w)
+        move_pieces = piece_ids[orientations]
+        move_orientations = orientation_ids[orientations]
+
+        pieces = self.piece_list.pieces
+        table = self.piece_list.orientations
+        move_list = []
+        # Same piece, x, y, orientation order as anchored_placements
+        for i in np.lexsort((move_orientations, ys, xs, move_pieces)):
+            (piece_id, orientation_id) = (int(move_pieces[i]), int(move_orientations[i]))
+            move_list.append(Move(pieces[piece_id], piece_id, table[piece_id][orientation_id].cells,
+                                  int(xs[i]), int(ys[i]), orientation_id))
+        return move_list
+
+    def update_legal_moves(self, player, moves, anchors):
+        """
+        Returns (legal moves, anchors) for <player>, computed from the legal
+        <moves> and <anchors> of an earlier state of this board instead of from
+        scratch.
+
+        Placements only ever take cells away from a player, so an old move is
+        still legal iff its piece is unused and all its cells are still legal;
+        the only new moves are the ones covering an anchor that was not there
+        before. The moves are not in get_legal_moves order.
+        """
+        legal = self._legal[player]
+        available = self.pieces[player]
+        move_list = [move for move in moves if available[move.piece_index] and
+                     all(legal[y + move.y, x + move.x] for (x, y) in move.orientation)]
+
+        new_anchors = self.anchors[player] - anchors
+        if new_anchors:
+            pieces = self.piece_list.pieces
+            table = self.piece_list.orientations
+            known = {(move.piece_index, move.x, move.y, move.orientation_id) for move in move_list}
+            for placement in anchored_placements(table, available, new_anchors, self.board_w, self.board_h):
+                if placement in known:
+                    continue
+                (piece_id, x, y, orientation_id) = placement
+                new_move = Move(pieces[piece_id], piece_id, table[piece_id][orientation_id].cells, x, y,
+                                orientation_id)
+                if self.check_move_valid(player, new_move):
+                    move_list.append(new_move)
+        return move_list, set(self.anchors[player])
+
     def check_move_valid(self, player, move):
         """
         Check if <player> can legally perform <move>.
@@ -171,6 +510,25 @@ class Board:
         # Otherwise, it's in the lookup table
         return self.connected[player, y, x]
 
+    def legal_mask(self, player):
+        """
+        Returns a (board_h x board_w) boolean array of the cells <player> may
+        place a tile on. Don't modify it.
+        """
+        return self._legal[player]
+
+    def anchor_mask(self, player):
+        """
+        Returns a (board_h x board_w) boolean array of <player>'s anchors.
+        """
+        return self.connected[player] & self._legal[player]
+
+    def available_pieces(self, player):
+        """
+        Returns a boolean array telling which pieces <player> can still use.
+        """
+        return self.pieces[player]
+
     def get_position(self, x, y):
         return self.state[y, x]
 
@@ -178,10 +536,18 @@ class Board:
         return self.scores[player]
 
     def __eq__(self, other):
-        return np.array_equal(self.state, other.state) and np.array_equal(self.pieces, other.pieces)
+        if hash(self) != hash(other):
+            return False
+        if not np.array_equal(self.pieces, other.pieces):
+            return False
+        if self.symmetries:
+            return symmetric_equal(self.state, other.state, self.symmetries)
+        return np.array_equal(self.state, other.state)
 
     def __hash__(self):
-        return hash(str(self.state))
+        if self.symmetric_zobrists:
+            return min(self.zobrist, *self.symmetric_zobrists)
+        return self.zobrist
 
     def __str__(self):
         out_str = []
@@ -194,33 +560,127 @@ class Board:
             out_str.append('\n')
         return ''.join(out_str)
 
+    def key(self):
+        """
+        Returns an immutable snapshot of this board, equal for equal boards.
+        """
+        if self.symmetries:
+            return symmetric_key(self.state, self.symmetries), self.pieces.tobytes()
+        return self.state.tobytes(), self.pieces.tobytes()
+
     def __copy__(self):
-        cpy_board = Board(self.board_w, self.board_h, self.num_players, self.piece_list)
+        cpy_board = Board.__new__(Board)
+        cpy_board.board_w = self.board_w
+        cpy_board.board_h = self.board_h
+        cpy_board.num_players = self.num_players
+        cpy_board.piece_list = self.piece_list
+        cpy_board._zobrist_keys = self._zobrist_keys
+        cpy_board.zobrist = self.zobrist
+        cpy_board.symmetries = self.symmetries
+        cpy_board.symmetric_zobrists = self.symmetric_zobrists
+        cpy_board._undo = []
         cpy_board.state = np.copy(self.state)
         cpy_board._legal = np.copy(self._legal)
         cpy_board.connected = np.copy(self.connected)
         cpy_board.pieces = np.copy(self.pieces)
+        cpy_board.anchors = [set(anchors) for anchors in self.anchors]
         cpy_board.scores = self.scores[:]
         return cpy_board
 
 
+class BoardDelta:
+    """
+    A BoardDelta is a successor board recorded as <move> by <player> on top of
+    its <parent> board.
+
+    The full board is only built (once) when something needs it; until then
+    get_position and score are answered from the parent and the move. Any
+    other attribute access materializes the board and is forwarded to it, so
+    a BoardDelta can be used wherever a Board (or BitBoard) is expected.
+    """
+
+    def __init__(self, parent, player, move):
+        if isinstance(parent, BoardDelta):
+            parent = parent.materialize()
+        self.parent = parent
+        self.player = player
+        self.move = move
+        self._board = None
+        self.zobrist = zobrist_after(parent, player, move)
+        if parent.symmetries:
+            self._hash = min(self.zobrist, *symmetric_zobrists_after(parent, player, move))
+        else:
+            self._hash = self.zobrist
+
+    def materialize(self):
+        """
+        Returns the full board this delta describes.
+        """
+        if self._board is None:
+            self._board = self.parent.do_move(self.player, self.move)
+            self.parent = None
+        return self._board
+
+    def get_position(self, x, y):
+        if self._board is not None:
+            return self._board.get_position(x, y)
+        if (x - self.move.x, y - self.move.y) in self.move.orientation:
+            return self.player
+        return self.parent.get_position(x, y)
+
+    def available_pieces(self, player):
+        if self._board is not None:
+            return self._board.available_pieces(player)
+        available = self.parent.available_pieces(player)
+        if player == self.player:
+            available = available.copy()
+            available[self.move.piece_index] = False
+        return available
+
+    def score(self, player):
+        if self._board is not None:
+            return self._board.score(player)
+        score = self.parent.score(player)
+        if player == self.player:
+            score += self.move.piece.get_num_tiles()
+        return score
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            # Keeps copy/pickle protocol lookups from materializing a half-built delta
+            raise AttributeError(name)
+        return getattr(self.materialize(), name)
+
+    def __eq__(self, other):
+        if hash(self) != hash(other):
+            return False
+        return self.materialize() == other
+
+    def __hash__(self):
+        return self._hash
+
+    def __str__(self):
+        return str(self.materialize())
+
+
 class Move:
     """
     A Move describes how one of the players is going to spend their move.
 
     It contains:
-    - Piece: the ID of the piece being used
-    - x/y: the center coordinates of the piece [0-19)
-    - Rotation: how many times the piece should be rotated CW [0-3]
-    - Flip: whether the piece should be flipped (True/False)
+    - piece/piece_index: the piece being used and its id in the PieceList
+    - orientation: the set of (x, y) tile offsets of the placed shape
+    - orientation_id: the id of that shape in PieceList.orientations, if known
+    - x/y: the offset the orientation is placed at
     """
 
-    def __init__(self, piece, piece_index, orientation, x=0, y=0):
+    def __init__(self, piece, piece_index, orientation, x=0, y=0, orientation_id=None):
         self.piece = piece
         self.piece_index = piece_index
         self.x = x
         self.y = y
         self.orientation = orientation
+        self.orientation_id = orientation_id
 
     def __str__(self):
         out_str = [[' ' for _ in range(5)] for _ in range(5)]
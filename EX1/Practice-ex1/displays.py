@@ -17,9 +17,10 @@ class Display(object):
 
     display_error_string = "Error: using base display class"
 
-    def draw_board(self, board):
+    def draw_board(self, board, dots=()):
         """
-        Draw the board onto the screen, command line, etc
+        Draw the board onto the screen, command line, etc, marking the (row,
+        col) positions in <dots>
         """
         raise NotImplementedError(Display.display_error_string)
 
@@ -29,7 +30,7 @@ class NoDisplay(Display):
     iterations of the game.
     """
 
-    def draw_board(self, board):
+    def draw_board(self, board, dots=()):
         pass
 
 
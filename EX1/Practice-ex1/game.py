@@ -1,11 +1,13 @@
-from inputs import RandomInput
+from inputs import RandomInput, MCTSInput
 from pieces import PieceList
 from blokus_problems import *
-from search import astar
+from search import astar, idastar, smastar, pastar, wastar, focal, beam, SearchStats
 from displays import GuiDisplay
+from transposition import TranspositionTable
 import sys
 import os
 import ast
+import functools
 
 
 class GameEngine(object):
@@ -14,8 +16,10 @@ class GameEngine(object):
     get input/draw output
     """
 
-    def __init__(self, inputs, width, height, piece_list):
-        self.display = GuiDisplay(width, height, title='Intro to AI -- 67842 -- Ex1')
+    def __init__(self, inputs, width, height, piece_list, display=None, engine='array'):
+        if display is None:
+            display = GuiDisplay(width, height, title='Intro to AI -- 67842 -- Ex1')
+        self.display = display
         self.inputs = inputs
 
         self.piece_list = piece_list
@@ -26,15 +30,16 @@ class GameEngine(object):
         self.turn_num = 0
         self.passed = [False] * self.num_players
         self.score = [0] * self.num_players
-        self.board = Board(self.board_w, self.board_h, self.num_players, self.piece_list)
+        self.history = []
+        self.board = BOARD_ENGINES[engine](self.board_w, self.board_h, self.num_players, self.piece_list)
 
         # Set up initial corners for each player
         if self.num_players > 1:
-            self.board.connected[1, 0, self.board_w - 1] = True
+            self.board.set_starting_point(1, (0, self.board_w - 1))
             if self.num_players > 2:
-                self.board.connected[2, self.board_h - 1, 0] = True
+                self.board.set_starting_point(2, (self.board_h - 1, 0))
                 if self.num_players > 3:
-                    self.board.connected[3, self.board_h - 1, self.board_h - 1] = True
+                    self.board.set_starting_point(3, (self.board_h - 1, self.board_w - 1))
 
     def play_turn(self):
         """
@@ -62,6 +67,7 @@ class GameEngine(object):
                 try:
                     self.score[p] += self.board.add_move(p, move)
                     self.board.pieces[p, move.piece_index] = False
+                    self.history.append((p, move))
                     break
                 except ValueError:
                     print("Error: move is illegal. Try again:")
@@ -79,19 +85,32 @@ class GameEngine(object):
         for p in range(self.num_players):
             print("Player %d: %d pts" % (p + 1, self.score[p]))
 
-    def play_game(self):
+    def play_game(self, verbose=True):
         if len(self.inputs) != 4:
             print("Error: Need 4 players for a game. ")
             sys.exit(1)
         while not self.all_players_passed():
             self.play_turn()
 
-        self._print_scores()
+        if verbose:
+            self._print_scores()
         return self.score
 
 
-def play_simple_search(problem, search_func):
-    back_trace = search_func(problem)
+def write_stats(stats, stats_file):
+    """
+    Write <stats> as JSON to the file <stats_file> ('-' for stdout).
+    """
+    if stats_file == '-':
+        print(stats.to_json(indent=2))
+    elif stats_file is not None:
+        with open(stats_file, 'w') as f:
+            f.write(stats.to_json(indent=2))
+
+
+def play_simple_search(problem, search_func, stats_file=None):
+    stats = SearchStats()
+    back_trace = search_func(problem, stats=stats)
     display = GuiDisplay(problem.board.board_w, problem.board.board_h, title='Intro to AI -- 67842 -- Ex1')
     board = problem.get_start_state()
     if problem.__class__ == BlokusCornersProblem:
@@ -105,10 +124,13 @@ def play_simple_search(problem, search_func):
         board.add_move(0, action)
         display.draw_board(board, dots=dots)
     print("Expanded nodes: %d, score: %d" % (problem.expanded, board.score(0)))
+    print(stats)
+    write_stats(stats, stats_file)
 
 
-def play_a_star_search(problem, heuristic):
-    back_trace = astar(problem, heuristic)
+def play_a_star_search(problem, heuristic, search_func=astar, stats_file=None):
+    stats = SearchStats()
+    back_trace = search_func(problem, heuristic, stats=stats)
     display = GuiDisplay(problem.board.board_w, problem.board.board_h, title='Intro to AI -- 67842 -- Ex1')
     board = problem.get_start_state()
 
@@ -124,6 +146,13 @@ def play_a_star_search(problem, heuristic):
         board.add_move(0, action)
         display.draw_board(board, dots=dots)
     print("Expanded nodes: %d, score: %d" % (problem.expanded, board.score(0)))
+    if stats.lower_bound is not None:
+        print("Solution cost: %d, optimal cost is at least %g" % (problem.get_cost_of_actions(back_trace),
+                                                                  stats.lower_bound))
+    print(stats)
+    if hasattr(problem, 'heuristic_cache'):
+        print(problem.heuristic_cache)
+    write_stats(stats, stats_file)
 
 
 def play_approximate_search(problem):
@@ -136,6 +165,58 @@ def play_approximate_search(problem):
     print("Expanded nodes: %d, score: %d" % (problem.expanded, board.score(0)))
 
 
+SIMPLE_SEARCHES = ['dfs', 'dfs_undo', 'bfs', 'ucs']
+HEURISTIC_SEARCHES = ['astar', 'idastar', 'smastar', 'pastar', 'wastar', 'focal', 'beam']
+
+
+def make_problem(puzzle, board_w, board_h, piece_list, starting_point=(0, 0), targets=None, engine='array',
+                 lazy_successors=False, time_limit=None, symmetry=False):
+    """
+    Builds the search problem for the -z <puzzle> option. <time_limit> is
+    only used by the sub-optimal and mini-contest solvers, None meaning
+    their default, and <symmetry> only by fill, corners and cover.
+    """
+    if puzzle == 'fill':
+        return BlokusFillProblem(board_w, board_h, piece_list, starting_point,
+                                 engine=engine, lazy_successors=lazy_successors, symmetry=symmetry)
+    elif puzzle == 'corners':
+        return BlokusCornersProblem(board_w, board_h, piece_list, starting_point,
+                                    engine=engine, lazy_successors=lazy_successors, symmetry=symmetry)
+    elif puzzle == 'cover':
+        return BlokusCoverProblem(board_w, board_h, piece_list, starting_point, targets,
+                                  engine=engine, lazy_successors=lazy_successors, symmetry=symmetry)
+    solver = {'sub-optimal': ClosestLocationSearch, 'mini-contest': MiniContestSearch}[puzzle]
+    time_limit = {'time_limit': time_limit} if time_limit is not None else {}
+    return solver(board_w, board_h, piece_list, starting_point, targets, engine=engine, **time_limit)
+
+
+def make_search_func(name, weight=1.5, beam_width=100, max_nodes=100000, max_mb=None, workers=None, table=None):
+    """
+    Returns the search function for the -f <name> option, with the other
+    options filled in. Searches in HEURISTIC_SEARCHES take (problem,
+    heuristic, stats=...), the others (problem, stats=...). The
+    transposition <table> is only used by astar.
+    """
+    if name in SIMPLE_SEARCHES:
+        return getattr(__import__('search'), name)
+    elif name == 'astar':
+        return functools.partial(astar, table=table) if table is not None else astar
+    elif name == 'idastar':
+        return idastar
+    elif name == 'smastar':
+        max_bytes = max_mb * 1024 * 1024 if max_mb is not None else None
+        return functools.partial(smastar, max_nodes=max_nodes, max_bytes=max_bytes)
+    elif name == 'pastar':
+        return functools.partial(pastar, num_workers=workers)
+    elif name == 'wastar':
+        return functools.partial(wastar, w=weight)
+    elif name == 'focal':
+        return functools.partial(focal, w=weight)
+    elif name == 'beam':
+        return functools.partial(beam, width=beam_width)
+    raise ValueError('unknown search function ' + name)
+
+
 def load_heuristic(heuristic_name):
     # Looks through all pythonPath Directories for the right function
     python_path_str = os.path.expandvars("$PYTHONPATH")
@@ -181,7 +262,28 @@ def main():
     parser.add_option('-f', '--search-function', dest='search_func',
                       metavar='FUNC', help='search function to use. This option is ignored for sub-optimal search. ',
                       type='choice',
-                      choices=['dfs', 'bfs', 'ucs', 'astar'], default='dfs')
+                      choices=SIMPLE_SEARCHES + HEURISTIC_SEARCHES,
+                      default='dfs')
+    parser.add_option('-W', '--weight', dest='weight', type='float',
+                      help='how far from optimal wastar and focal may be, as a cost factor (at least 1)', default=1.5)
+    parser.add_option('-b', '--beam-width', dest='beam_width', type='int',
+                      help='the number of nodes beam keeps per depth', default=100)
+    parser.add_option('-j', '--stats-json', dest='stats_file', metavar='FILE',
+                      help='write the search statistics as JSON to FILE (- for stdout)', default=None)
+    parser.add_option('-T', '--table', dest='table_file', metavar='FILE',
+                      help='a transposition table file astar reads and adds its results to', default=None)
+    parser.add_option('--table-slots', dest='table_slots', type='int',
+                      help='the number of entries a new transposition table holds', default=1 << 16)
+    parser.add_option('-m', '--max-nodes', dest='max_nodes', type='int',
+                      help='the most search nodes smastar may keep in memory', default=100000)
+    parser.add_option('-M', '--max-mb', dest='max_mb', type='int',
+                      help='the most megabytes of search nodes smastar may keep in memory', default=None)
+    parser.add_option('-t', '--time-limit', dest='time_limit', type='float',
+                      help='seconds the sub-optimal and mini-contest solvers may run, or mcts players may think '
+                           'per move', default=None)
+    parser.add_option('-w', '--workers', dest='workers', type='int',
+                      help='the number of worker processes pastar and mcts players use (default: one per CPU '
+                           'for pastar, one for mcts)', default=None)
     parser.add_option('-H', '--heuristic', dest='h_func',
                       help='heuristic function to use for A* search. \
                       This option is ignored for other search functions. ',
@@ -191,42 +293,62 @@ def main():
                       choices=['fill', 'diagonal', 'corners', 'cover', 'sub-optimal', 'mini-contest'], default=None)
     parser.add_option('-x', '--start-point', dest='start', type='int', nargs=2,
                       help='starting point', default=(0, 0))
+    parser.add_option('-e', '--engine', dest='engine',
+                      help='the board engine used by the search problems', type='choice',
+                      choices=sorted(BOARD_ENGINES), default='array')
+    parser.add_option('-P', '--players', dest='players', metavar='P1,P2,P3,P4',
+                      help='the 4 players of a game, each random or mcts', default='random,random,random,random')
+    parser.add_option('-l', '--lazy-successors', dest='lazy', action='store_true',
+                      help='only build successor boards once the search looks at them', default=False)
+    parser.add_option('-y', '--symmetry', dest='symmetry', action='store_true',
+                      help='search one board of every class of mirror images of the puzzle', default=False)
 
     options, cover_points = parser.parse_args()
     if (options.puzzle == 'cover' or options.puzzle == 'sub-optimal') and len(cover_points) == 0:
         raise Exception('cover puzzles require at least one point to cover!')
+    if options.weight < 1:
+        raise Exception('the weight of wastar and focal must be at least 1')
 
+    targets = None
     if options.puzzle == 'cover' or options.puzzle == 'sub-optimal' or options.puzzle == 'mini-contest':
         targets = ast.literal_eval(''.join(cover_points))
         # targets = [(2,2),(5, 5), (1, 4)]
     piece_list = PieceList(options.pieces_file)
 
     if options.puzzle is None:
-        inputs = [RandomInput() for _ in range(4)]
+        inputs = []
+        for name in options.players.split(','):
+            if name == 'mcts':
+                inputs.append(MCTSInput(options.time_limit or 1.0, options.workers or 1, verbose=True))
+            elif name == 'random':
+                inputs.append(RandomInput())
+            else:
+                raise Exception('unknown player ' + name)
         engine = GameEngine(inputs, options.size[1], options.size[0], piece_list)
         engine.play_game()
-
-    elif options.puzzle == 'sub-optimal':
-        problem = ClosestLocationSearch(options.size[1], options.size[0], piece_list, options.start, targets)
-        play_approximate_search(problem)
-
-    elif options.puzzle == 'mini-contest':
-        problem = MiniContestSearch(options.size[1], options.size[0], piece_list, options.start, targets)
+        for player in inputs:
+            if isinstance(player, MCTSInput):
+                print("MCTS simulations per second: %.1f" % player.simulations_per_second())
+                player.close()
+
+    elif options.puzzle in ['sub-optimal', 'mini-contest']:
+        problem = make_problem(options.puzzle, options.size[1], options.size[0], piece_list, options.start, targets,
+                               options.engine, time_limit=options.time_limit)
         play_approximate_search(problem)
 
-    elif options.search_func in ['dfs', 'bfs', 'ucs', 'astar']:
-        if options.puzzle == 'fill':
-            problem = BlokusFillProblem(options.size[1], options.size[0], piece_list, options.start)
-        elif options.puzzle == 'corners':
-            problem = BlokusCornersProblem(options.size[1], options.size[0], piece_list, options.start)
-        elif options.puzzle == 'cover':
-            problem = BlokusCoverProblem(options.size[1], options.size[0], piece_list, options.start, targets)
-
-        if options.search_func in ['dfs', 'bfs', 'ucs']:
-            search = __import__('search')
-            play_simple_search(problem, getattr(search, options.search_func))
-        elif options.search_func == 'astar':
-            play_a_star_search(problem, load_heuristic(options.h_func))
+    elif options.search_func in SIMPLE_SEARCHES + HEURISTIC_SEARCHES:
+        problem = make_problem(options.puzzle, options.size[1], options.size[0], piece_list, options.start, targets,
+                               options.engine, options.lazy, symmetry=options.symmetry)
+        table = TranspositionTable(options.table_file, options.table_slots) if options.table_file else None
+        search_func = make_search_func(options.search_func, options.weight, options.beam_width, options.max_nodes,
+                                       options.max_mb, options.workers, table)
+        if options.search_func in SIMPLE_SEARCHES:
+            play_simple_search(problem, search_func, options.stats_file)
+        else:
+            play_a_star_search(problem, load_heuristic(options.h_func), search_func, options.stats_file)
+        if table is not None:
+            print(table)
+            table.close()
     else:
         raise Exception('unrecognized options')
 
@@ -1,3 +1,9 @@
+import math
+import multiprocessing
+import random
+import time
+
+
 class Input(object):
     """
     The Input class defines an interface for the game engine to get input
@@ -29,13 +35,256 @@ class Input(object):
 class RandomInput(Input):
     """RandomInput players choose random moves (equally distributed over piece
     number, x/y, and rotation/flip)
+
+    Pass a random.Random as <rng> to make the choices reproducible.
     """
 
-    def get_move(self, player, board):
-        import random
+    def __init__(self, rng=None):
+        self.random = rng if rng is not None else random
 
+    def get_move(self, player, board):
         move_list = board.get_legal_moves(player)
         if move_list:
-            return move_list[random.randint(0, len(move_list) - 1)]
+            return move_list[self.random.randint(0, len(move_list) - 1)]
+        # else
+        return None
+
+
+class IncrementalRandomInput(RandomInput):
+    """A RandomInput that keeps each player's legal moves between turns and
+    only updates them for the placements made since (see
+    Board.update_legal_moves) instead of generating them all again. The moves
+    are chosen from the same set, so the play is just as random.
+    """
+
+    def __init__(self, rng=None):
+        super().__init__(rng)
+        self.board = None
+        self.moves = {}
+
+    def get_move(self, player, board):
+        if board is not self.board:
+            # A new game
+            self.board = board
+            self.moves = {}
+
+        (move_list, anchors) = self.moves.get(player, ([], set()))
+        (move_list, anchors) = board.update_legal_moves(player, move_list, anchors)
+        self.moves[player] = (move_list, anchors)
+        if move_list:
+            return move_list[self.random.randint(0, len(move_list) - 1)]
         # else
         return None
+
+
+class _MCTSNode(object):
+    """A node of MCTSInput's search tree: <board> with <player> to move (None
+    once the game is over), reached by <move>. rewards holds every player's
+    summed reward over the simulations through the node, and untried the
+    moves not expanded yet, the ones to try first last.
+    """
+
+    __slots__ = ('board', 'player', 'move', 'parent', 'children', 'untried', 'visits', 'rewards')
+
+    def __init__(self, board, player, moves, move=None, parent=None):
+        self.board = board
+        self.player = player
+        self.move = move
+        self.parent = parent
+        self.children = []
+        self.untried = moves
+        self.visits = 0
+        self.rewards = [0.0] * board.num_players
+
+
+class MCTSInput(Input):
+    """MCTSInput players pick their move with Monte Carlo tree search.
+
+    The tree is searched with max^n UCT: every node is scored from the view
+    of the player to move there, and a simulation's reward is each player's
+    share of the win. Since a Blokus position has hundreds of moves, a node
+    only gets its k-th child after widening_c * visits ** widening_alpha
+    visits (progressive widening), trying the biggest pieces first. Leaves
+    are evaluated by random playouts (at most <rollout_depth> moves, then
+    scored by the tiles placed) on a BitBoard with incrementally updated
+    move lists.
+
+    Each move gets <time_limit> seconds. With <num_workers> > 1, that many
+    processes search independent trees (root parallelization) and their
+    root statistics are summed. simulations and seconds add up over the
+    game; simulations_per_second() is the throughput.
+    """
+
+    def __init__(self, time_limit=1.0, num_workers=1, exploration=0.7, widening_c=2.0, widening_alpha=0.5,
+                 rollout_depth=None, rng=None, verbose=False):
+        self.time_limit = time_limit
+        self.num_workers = num_workers
+        self.exploration = exploration
+        self.widening_c = widening_c
+        self.widening_alpha = widening_alpha
+        self.rollout_depth = rollout_depth
+        self.random = rng if rng is not None else random.Random()
+        self.verbose = verbose
+        self.simulations = 0
+        self.seconds = 0.0
+        self._pool = None
+
+    def simulations_per_second(self):
+        return self.simulations / self.seconds if self.seconds else 0.0
+
+    def get_move(self, player, board):
+        from bitboard import BitBoard
+
+        start = time.perf_counter()
+        board = BitBoard.from_board(board)
+        moves = board.get_legal_moves(player)
+        if len(moves) <= 1:
+            return moves[0] if moves else None
+
+        if self.num_workers > 1:
+            if self._pool is None:
+                if 'fork' in multiprocessing.get_all_start_methods():
+                    context = multiprocessing.get_context('fork')
+                else:
+                    context = multiprocessing.get_context()
+                self._pool = context.Pool(self.num_workers)
+            seeds = [self.random.randrange(1 << 30) for _ in range(self.num_workers)]
+            results = self._pool.starmap(_mcts_worker, [(self, board, player, seed) for seed in seeds])
+        else:
+            results = [self.search(board, player)]
+
+        # Sum the root statistics of all trees and play the most visited move
+        visits = {}
+        by_key = {}
+        simulations = 0
+        for (tree_simulations, root_stats) in results:
+            simulations += tree_simulations
+            for (move, move_visits) in root_stats:
+                key = (move.piece_index, move.x, move.y, move.orientation_id)
+                visits[key] = visits.get(key, 0) + move_visits
+                by_key[key] = move
+        best = max(visits, key=lambda key: visits[key])
+
+        seconds = time.perf_counter() - start
+        self.simulations += simulations
+        self.seconds += seconds
+        if self.verbose:
+            print("Player %d: %d simulations in %.2f s (%.0f per second)" %
+                  (player + 1, simulations, seconds, simulations / seconds))
+        # The move objects are the same for both engines
+        return by_key[best]
+
+    def close(self):
+        """
+        Stops the worker processes, if any.
+        """
+        if self._pool is not None:
+            self._pool.terminate()
+            self._pool = None
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_pool'] = None
+        return state
+
+    def search(self, board, player):
+        """
+        Runs simulations from <board> with <player> to move until the time is
+        up (at least one). Returns (simulations, [(move, visits) for every root child]).
+        """
+        deadline = time.perf_counter() + self.time_limit
+        num_players = board.num_players
+        root = _MCTSNode(board, player, self._order(board.get_legal_moves(player)))
+        simulations = 0
+        while simulations == 0 or time.perf_counter() < deadline:
+            node = self._select(root)
+            rewards = self._rollout(node)
+            while node is not None:
+                node.visits += 1
+                for p in range(num_players):
+                    node.rewards[p] += rewards[p]
+                node = node.parent
+            simulations += 1
+        return simulations, [(child.move, child.visits) for child in root.children]
+
+    def _order(self, moves):
+        """
+        Shuffles <moves> and puts the biggest pieces last, so that popping
+        from the end tries them first.
+        """
+        self.random.shuffle(moves)
+        moves.sort(key=lambda move: move.piece.get_num_tiles())
+        return moves
+
+    def _next_player(self, board, player):
+        """
+        Returns (the next player after <player> who can move, their moves),
+        or (None, []) once nobody can.
+        """
+        for step in range(1, board.num_players + 1):
+            p = (player + step) % board.num_players
+            moves = board.get_legal_moves(p)
+            if moves:
+                return p, moves
+        return None, []
+
+    def _select(self, node):
+        """
+        Walks down from <node> by UCT, expanding a new child wherever
+        progressive widening allows one, and returns the node to simulate
+        from.
+        """
+        while node.player is not None:
+            allowed = max(1, int(math.ceil(self.widening_c * node.visits ** self.widening_alpha)))
+            if node.untried and len(node.children) < allowed:
+                move = node.untried.pop()
+                board = node.board.do_move(node.player, move)
+                (next_player, moves) = self._next_player(board, node.player)
+                child = _MCTSNode(board, next_player, self._order(moves), move, node)
+                node.children.append(child)
+                return child
+
+            log_visits = math.log(node.visits)
+            player = node.player
+            node = max(node.children,
+                       key=lambda child: child.rewards[player] / child.visits +
+                       self.exploration * math.sqrt(log_visits / child.visits))
+        return node
+
+    def _rollout(self, node):
+        """
+        Plays random moves from <node> until the game ends (or
+        rollout_depth moves were played) and returns every player's reward.
+        """
+        board = node.board.__copy__()
+        num_players = board.num_players
+        player = node.player
+        move_lists = [([], set()) for _ in range(num_players)]
+        passed = [False] * num_players
+        depth = 0
+        while player is not None and (self.rollout_depth is None or depth < self.rollout_depth):
+            (moves, anchors) = board.update_legal_moves(player, *move_lists[player])
+            move_lists[player] = (moves, anchors)
+            if moves:
+                board.add_move(player, moves[self.random.randrange(len(moves))])
+                depth += 1
+            else:
+                passed[player] = True
+            if all(passed):
+                break
+            player = (player + 1) % num_players
+            while passed[player]:
+                player = (player + 1) % num_players
+
+        scores = [board.score(p) for p in range(num_players)]
+        best = max(scores)
+        winners = [p for p in range(num_players) if scores[p] == best]
+        return [1.0 / len(winners) if p in winners else 0.0 for p in range(num_players)]
+
+
+def _mcts_worker(mcts_input, board, player, seed):
+    """
+    One root-parallel tree search of MCTSInput, run in a worker process.
+    """
+    mcts_input.random = random.Random(seed)
+    return mcts_input.search(board, player)
@@ -1,9 +1,17 @@
 import os
+from collections import namedtuple
 
 """
 Classes and utilities to describe all of the game pieces.
 """
 
+# One distinct placement shape of a piece, as stored in PieceList.orientations:
+# - piece_id/orientation_id: index of the piece in the list / of the shape in the piece
+# - tiles: the (x, y) offsets of the tiles, normalized so min x = min y = 0
+# - width/height: the bounding box of the tiles
+# - cells: the same tiles as a frozenset (what Move.orientation holds)
+Orientation = namedtuple('Orientation', ['piece_id', 'orientation_id', 'tiles', 'width', 'height', 'cells'])
+
 
 def negate_list_positive(lst):
     """
@@ -143,6 +151,7 @@ class PieceList(object):
         ##O##
         """
         self.pieces = []
+        self.orientations = ()
         directory = "layouts"
         if fname is not None:
             with open(os.path.join(directory, fname)) as f:
@@ -174,6 +183,34 @@ class PieceList(object):
 
                 line_index += 1 + num_lines
 
+            self.build_orientation_table()
+
+    def build_orientation_table(self):
+        """
+        Build self.orientations: for every piece id, a tuple of its distinct
+        Orientation records. Symmetric duplicates are already merged by Piece,
+        and the orientation ids follow the order iterating the Piece yields.
+        """
+        table = []
+        for piece_id, piece in enumerate(self.pieces):
+            piece_orientations = []
+            for orientation_id, ori in enumerate(piece):
+                min_x = min(x for (x, _) in ori)
+                min_y = min(y for (_, y) in ori)
+                tiles = tuple((x - min_x, y - min_y) for (x, y) in ori)
+                width = max(x for (x, _) in tiles) + 1
+                height = max(y for (_, y) in tiles) + 1
+                piece_orientations.append(Orientation(piece_id, orientation_id, tiles, width, height,
+                                                      frozenset(tiles)))
+            table.append(tuple(piece_orientations))
+        self.orientations = tuple(table)
+
+    def get_orientations(self, n):
+        """
+        Return the Orientation records of piece <n>.
+        """
+        return self.orientations[n]
+
     def get_num_pieces(self):
         """
         Return the number of distinct pieces in the list.
@@ -195,4 +232,5 @@ class PieceList(object):
     def copy(self):
         cpy_p_list = PieceList(None)
         cpy_p_list.pieces = [piece.copy() for piece in self.pieces]
+        cpy_p_list.build_orientation_table()
         return cpy_p_list
@@ -2,28 +2,58 @@
 In search.py, you will implement generic search algorithms
 """
 
+import contextlib
+import heapq
+import itertools
+import json
+import multiprocessing
+import queue
+import sys
+import time
+import traceback
+
 import util
+from transposition import problem_signature, state_hash
 
 
 class SearchNode:
-    def __init__(self, state, actions, cost):
+    __slots__ = ('state', 'parent', 'action', 'cost', 'depth')
+
+    def __init__(self, state, parent=None, action=None, cost=0):
         """
-        Initializes a SearchNode with the specified state, actions, and cost.
+        Initializes a SearchNode reached from <parent> by <action>.
 
         Parameters:
         -----------
         state : object
             The state of the node in the search problem.
 
-        actions :
-            A list of actions taken to reach this node from the start state.
+        parent : SearchNode
+            The node this one was expanded from, or None for the start node.
 
-        cost :t
+        action :
+            The action taken in the parent's state to reach this node.
+
+        cost :
             The cost to reach this node from the start state.
         """
         self.state = state
-        self.actions = actions
+        self.parent = parent
+        self.action = action
         self.cost = cost
+        self.depth = 0 if parent is None else parent.depth + 1
+
+    def get_actions(self):
+        """
+        Returns the list of actions leading from the start state to this node,
+        following the parent pointers.
+        """
+        actions = [None] * self.depth
+        node = self
+        while node.parent is not None:
+            actions[node.depth - 1] = node.action
+            node = node.parent
+        return actions
 
     def __lt__(self, other):
         """
@@ -42,6 +72,150 @@ class SearchNode:
         return self.cost < other.cost
 
 
+class SearchStats:
+    """
+    Counters filled in by the searches that accept a <stats> argument.
+
+    - expanded: the states whose successors were generated
+    - generated: the successors generated
+    - branching: {depth: [expanded, generated]} over the expanded nodes
+    - closed_peak: the largest number of states the search kept to
+      recognize duplicates (its closed / visited set)
+    - times: seconds spent getting successors, evaluating the heuristic and
+      pushing to / popping from the frontier
+    - frontier_peak: the largest number of entries the frontier held
+    - reexpansions: states expanded again after a cheaper path was found
+    - duplicates_pruned: successors dropped since their state already had
+      an equal or cheaper path
+    - stale_discarded: frontier entries skipped when popped since a cheaper
+      path to their state was pushed later
+    - forgotten: nodes a memory-bounded search dropped to stay in budget
+    - worker_expanded: for parallel searches, the nodes each worker expanded
+    - lower_bound: a proven lower bound on the optimal solution cost, for the
+      searches that can tell
+    - suboptimality_bound: the returned solution costs at most this many
+      times the optimum (1.0 means optimal). Only meaningful when the
+      heuristic is admissible; None if the search gives no bound
+    """
+
+    def __init__(self):
+        self.expanded = 0
+        self.generated = 0
+        self.branching = {}
+        self.closed_peak = 0
+        self.times = {'successors': 0.0, 'heuristic': 0.0, 'queue': 0.0}
+        self.frontier_peak = 0
+        self.reexpansions = 0
+        self.duplicates_pruned = 0
+        self.stale_discarded = 0
+        self.forgotten = 0
+        self.worker_expanded = []
+        self.lower_bound = None
+        self.suboptimality_bound = None
+
+    @contextlib.contextmanager
+    def timer(self, part):
+        """
+        Adds the time spent in the with block to times[<part>].
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.times[part] += time.perf_counter() - start
+
+    def record_expansion(self, depth, generated):
+        self.expanded += 1
+        self.generated += generated
+        level = self.branching.setdefault(depth, [0, 0])
+        level[0] += 1
+        level[1] += generated
+
+    def successors(self, problem, node):
+        """
+        problem.get_successors(node.state), timed and counted.
+        """
+        with self.timer('successors'):
+            successors = problem.get_successors(node.state)
+        self.record_expansion(node.depth, len(successors))
+        return successors
+
+    def timed_heuristic(self, heuristic):
+        """
+        Wraps <heuristic> so the time spent in it is added to times['heuristic'].
+        """
+        def timed(state, problem=None):
+            with self.timer('heuristic'):
+                return heuristic(state, problem)
+        return timed
+
+    def observe(self, frontier_size, closed_size=0):
+        self.frontier_peak = max(self.frontier_peak, frontier_size)
+        self.closed_peak = max(self.closed_peak, closed_size)
+
+    def merge(self, other):
+        """
+        Adds the counters of <other>, e.g. a parallel worker's, to these.
+        Peaks are the largest of either.
+        """
+        self.expanded += other.expanded
+        self.generated += other.generated
+        for (depth, (expanded, generated)) in other.branching.items():
+            level = self.branching.setdefault(depth, [0, 0])
+            level[0] += expanded
+            level[1] += generated
+        for (part, seconds) in other.times.items():
+            self.times[part] += seconds
+        self.closed_peak = max(self.closed_peak, other.closed_peak)
+        self.frontier_peak = max(self.frontier_peak, other.frontier_peak)
+        self.reexpansions += other.reexpansions
+        self.duplicates_pruned += other.duplicates_pruned
+        self.stale_discarded += other.stale_discarded
+        self.forgotten += other.forgotten
+
+    def branching_factors(self):
+        """
+        Returns {depth: average successors per node expanded at that depth}.
+        """
+        return {depth: generated / expanded for (depth, (expanded, generated)) in sorted(self.branching.items())}
+
+    def as_dict(self):
+        return {
+            'expanded': self.expanded,
+            'generated': self.generated,
+            'branching_factor': self.generated / self.expanded if self.expanded else 0.0,
+            'branching_by_depth': {depth: {'expanded': expanded, 'generated': generated}
+                                   for (depth, (expanded, generated)) in sorted(self.branching.items())},
+            'duplicates_pruned': self.duplicates_pruned,
+            'stale_discarded': self.stale_discarded,
+            'reexpansions': self.reexpansions,
+            'forgotten': self.forgotten,
+            'frontier_peak': self.frontier_peak,
+            'closed_peak': self.closed_peak,
+            'times': dict(self.times),
+            'worker_expanded': list(self.worker_expanded),
+            'lower_bound': self.lower_bound,
+            'suboptimality_bound': self.suboptimality_bound,
+        }
+
+    def to_json(self, **kwargs):
+        return json.dumps(self.as_dict(), **kwargs)
+
+    def __str__(self):
+        out_str = ("Expanded: %d, generated: %d, closed peak: %d, seconds in successors / heuristic / queue: "
+                   "%.3f / %.3f / %.3f\n" %
+                   (self.expanded, self.generated, self.closed_peak, self.times['successors'],
+                    self.times['heuristic'], self.times['queue']))
+        out_str += ("Frontier peak: %d, re-expansions: %d, duplicates pruned: %d, stale entries: %d, forgotten: %d" %
+                   (self.frontier_peak, self.reexpansions, self.duplicates_pruned, self.stale_discarded,
+                    self.forgotten))
+        if self.worker_expanded:
+            out_str += ", expanded per worker: %s" % self.worker_expanded
+        if self.suboptimality_bound is not None:
+            out_str += ", cost within %.3g times the optimum" % self.suboptimality_bound
+        return out_str
+
+
 class SearchProblem:
     """
     This class outlines the structure of a search problem, but doesn't implement
@@ -86,147 +260,967 @@ class SearchProblem:
         util.raiseNotDefined()
 
 
-def depth_first_search(search_problem):
-    # Stack for holding the nodes to visit, initialized with the start state and an empty path
+def depth_first_search(search_problem, stats=None):
+    if stats is None:
+        stats = SearchStats()
+
+    # Stack for holding the nodes to visit, initialized with the start state
     stack = util.Stack()
-    stack.push((search_problem.get_start_state(), []))
+    stack.push(SearchNode(search_problem.get_start_state()))
 
     # Set for tracking visited nodes to avoid revisits and loops
     visited = set()
 
     while not stack.isEmpty():
-        current_state, path = stack.pop()
+        stats.observe(len(stack.list), len(visited))
+        with stats.timer('queue'):
+            current_node = stack.pop()
+        current_state = current_node.state
 
         # Check if the current state is the goal state
         if search_problem.is_goal_state(current_state):
-            return path  # Return the path that led to the goal state
+            return current_node.get_actions()  # Return the path that led to the goal state
 
         # If the state hasn't been visited, process its successors
         if current_state not in visited:
             visited.add(current_state)
             # Explore the successors
-            for successor, action, step_cost in search_problem.get_successors(current_state):
+            for successor, action, step_cost in stats.successors(search_problem, current_node):
                 if successor not in visited:
-                    # Append the current action to the path and push the successor to the stack
-                    stack.push((successor, path + [action]))
+                    # Push the successor, remembering which node it came from
+                    with stats.timer('queue'):
+                        stack.push(SearchNode(successor, current_node, action))
+                else:
+                    stats.duplicates_pruned += 1
 
 
-def breadth_first_search(problem):
+def depth_first_search_undo(problem, stats=None):
+    """
+    Depth first search that walks the tree on the start state itself instead
+    of copying a state per successor.
+
+    Besides the SearchProblem methods, the problem must provide
+    get_actions(state), apply_action(state, action), undo_action(state, action)
+    and get_state_key(state), an immutable snapshot used for the visited set.
+    Successors are tried in the same order depth_first_search pops them, and
+    the start state is restored before returning.
+    """
+    if stats is None:
+        stats = SearchStats()
+
+    def expand(depth):
+        with stats.timer('successors'):
+            actions = problem.get_actions(state)
+        stats.record_expansion(depth, len(actions))
+        return reversed(actions)
+
+    state = problem.get_start_state()
+    visited = {problem.get_state_key(state)}
+    path = []
+    if problem.is_goal_state(state):
+        return path
+
+    stack = [expand(0)]
+    while stack:
+        stats.observe(len(stack), len(visited))
+        action = next(stack[-1], None)
+        if action is None:
+            # Every action from this state was tried; step back to its parent
+            stack.pop()
+            if path:
+                problem.undo_action(state, path.pop())
+            continue
+
+        problem.apply_action(state, action)
+        key = problem.get_state_key(state)
+        if key in visited:
+            stats.duplicates_pruned += 1
+            problem.undo_action(state, action)
+            continue
+        visited.add(key)
+        path.append(action)
+
+        if problem.is_goal_state(state):
+            plan = path[:]
+            for action in reversed(plan):
+                problem.undo_action(state, action)
+            return plan
+        stack.append(expand(len(path)))
+
+    return []
+
+
+def breadth_first_search(problem, stats=None):
     """
     Search the shallowest nodes in the search tree first.
     """
+    if stats is None:
+        stats = SearchStats()
 
     # Initialize the frontier using the initial state of the problem
     queue = util.Queue()
-    start_state = problem.get_start_state()
-    queue.push((start_state, []))  # Push the initial state and the path to reach it
+    queue.push(SearchNode(problem.get_start_state()))  # Push the initial state
 
     # Initialize the explored set to keep track of visited nodes
     visited = set()
 
     while not queue.isEmpty():
-        current_state, path = queue.pop()
+        stats.observe(len(queue.list), len(visited))
+        with stats.timer('queue'):
+            current_node = queue.pop()
+        current_state = current_node.state
 
         # Check if the current state is a goal state
         if problem.is_goal_state(current_state):
-            return path  # Return the path that led to the goal
+            return current_node.get_actions()  # Return the path that led to the goal
 
         # Only process the current state if it has not been visited
         if current_state not in visited:
             visited.add(current_state)
 
             # Expand the current state to its successors
-            for successor, action, step_cost in problem.get_successors(current_state):
+            for successor, action, step_cost in stats.successors(problem, current_node):
                 if successor not in visited:
-                    # Create a new path to the successor including the current action
-                    new_path = path + [action]
-                    # Push the successor and the new path to the queue
-                    queue.push((successor, new_path))
+                    # Push the successor, remembering which node it came from
+                    with stats.timer('queue'):
+                        queue.push(SearchNode(successor, current_node, action))
+                else:
+                    stats.duplicates_pruned += 1
 
 
-def uniform_cost_search(problem):
+def uniform_cost_search(problem, stats=None):
     """
     Search the node of least total cost first.
     """
+    return best_first_search(problem, null_heuristic, stats)
+
+
+def null_heuristic(state, problem=None):
+    """
+    A heuristic function estimates the cost from the current state to the nearest
+    goal in the provided SearchProblem.  This heuristic is trivial.
+    """
+    return 0
+
+
+def a_star_search(problem, heuristic=null_heuristic, stats=None, table=None):
+    """
+    Search the node that has the lowest combined cost and heuristic first.
+
+    With a transposition.TranspositionTable as <table>, results of earlier
+    searches of the same problem are reused, and this one's are stored (see
+    best_first_search).
+    """
+    return best_first_search(problem, heuristic, stats, table=table)
+
+
+def weighted_a_star_search(problem, heuristic=null_heuristic, w=1.5, stats=None):
+    """
+    Search the node that has the lowest cost + w * heuristic first. With an
+    admissible heuristic the solution costs at most w times the optimum, and
+    the larger w, the fewer nodes are usually expanded to find it. w must be
+    at least 1.
+    """
+    if w < 1:
+        raise ValueError('weighted A* needs a weight of at least 1, got %r' % w)
+    return best_first_search(problem, heuristic, stats, weight=w)
+
+
+class _CachedPlanNode(SearchNode):
+    """
+    A frontier entry for reaching a goal from <state> by a plan found in a
+    transposition table: its cost is that of the whole solution.
+    """
+    __slots__ = ('plan',)
+
+    def __init__(self, node, plan, cost):
+        super().__init__(node.state, node.parent, node.action, cost)
+        self.depth = node.depth
+        self.plan = plan
+
+
+def best_first_search(problem, heuristic, stats=None, weight=1, table=None):
+    """
+    The engine behind uniform_cost_search, a_star_search and
+    weighted_a_star_search: expand the node with the lowest
+    cost + weight * heuristic first.
+
+    The best cost found so far for every generated state is kept in best_g.
+    A successor is only pushed if it improves on it, and heap entries that
+    were improved on after being pushed are skipped when popped, so the
+    frontier holds at most one live entry per state. Pass a SearchStats to
+    get the frontier peak, re-expansions and pruned duplicates.
+
+    With a transposition <table> (the problem must provide get_signature,
+    encode_action and decode_action), every state's stored lower bound
+    raises its heuristic, and a state with a stored optimal plan is not
+    expanded: the whole solution through it goes on the frontier instead,
+    at its exact cost. Once an optimal search (weight 1) succeeds, the plan
+    from every state on the solution path and a lower bound for every
+    expanded state are stored.
+    """
+    if stats is None:
+        stats = SearchStats()
+    if table is not None:
+        signature = problem_signature(problem)
+        heuristic = _bounded_heuristic(heuristic, table, signature)
+    heuristic = stats.timed_heuristic(heuristic)
 
     # Initialize the priority queue
     frontier = util.PriorityQueue()
     # Start with the initial state
-    start_node = SearchNode(problem.get_start_state(), [], 0)
-    frontier.push(start_node, start_node.cost)
+    start_state = problem.get_start_state()
+    start_node = SearchNode(start_state)
+    frontier.push(start_node, start_node.cost + weight * heuristic(start_state, problem))
+    best_g = {start_state: 0}
     # Initialize an empty set for explored nodes
     explored = set()
 
     while not frontier.isEmpty():
-        # Get the node with the lowest cost
-        current_node = frontier.pop()
+        stats.observe(len(frontier.heap), len(best_g))
+        # Get the node with the lowest combined cost and heuristic
+        with stats.timer('queue'):
+            current_node = frontier.pop()
+
+        # A cached plan's cost includes the rest of the plan; a cheaper path to
+        # its state would have pushed a cheaper entry of its own
+        cached_plan = current_node.plan if isinstance(current_node, _CachedPlanNode) else None
+
+        # A cheaper path to this state was pushed after this entry
+        if cached_plan is None and current_node.cost > best_g[current_node.state]:
+            stats.stale_discarded += 1
+            continue
 
         # Check if the state is the goal state
-        if problem.is_goal_state(current_node.state):
-            return current_node.actions
+        if cached_plan is not None or problem.is_goal_state(current_node.state):
+            stats.lower_bound = current_node.cost / weight
+            stats.suboptimality_bound = weight
+            actions = current_node.get_actions() + [problem.decode_action(code) for code in (cached_plan or [])]
+            if table is not None and weight == 1:
+                # A cached plan's own state is in the table already
+                path_node = current_node.parent if cached_plan is not None else current_node
+                _store_solution(table, signature, problem, path_node, current_node.cost, actions, best_g, explored)
+            return actions
 
-        # If the state has not been explored yet
-        if current_node.state not in explored:
-            explored.add(current_node.state)
+        if table is not None:
+            entry = table.lookup(signature, state_hash(current_node.state))
+            if entry is not None and entry[1] is not None:
+                (cost_to_go, plan, _) = entry
+                cached_node = _CachedPlanNode(current_node, plan, current_node.cost + cost_to_go)
+                with stats.timer('queue'):
+                    frontier.push(cached_node, cached_node.cost)
+                continue
 
-            # Expand the node
-            for next_state, action, step_cost in problem.get_successors(current_node.state):
-                new_cost = current_node.cost + step_cost
-                new_actions = current_node.actions + [action]
-                new_node = SearchNode(next_state, new_actions, new_cost)
-                frontier.push(new_node, new_node.cost)
+        if current_node.state in explored:
+            stats.reexpansions += 1
+        explored.add(current_node.state)
+
+        # Expand the node
+        for next_state, action, step_cost in stats.successors(problem, current_node):
+            new_cost = current_node.cost + step_cost
+            if new_cost >= best_g.get(next_state, float('inf')):
+                stats.duplicates_pruned += 1
+                continue
+            best_g[next_state] = new_cost
+            new_node = SearchNode(next_state, current_node, action, new_cost)
+            priority = new_cost + weight * heuristic(next_state, problem)
+            with stats.timer('queue'):
+                frontier.push(new_node, priority)
 
     # If no solution is found, return failure
     return []
 
 
-def null_heuristic(state, problem=None):
+def _bounded_heuristic(heuristic, table, signature):
     """
-    A heuristic function estimates the cost from the current state to the nearest
-    goal in the provided SearchProblem.  This heuristic is trivial.
+    Returns <heuristic> raised to the lower bounds stored in <table>.
     """
-    return 0
+    def bounded(state, problem=None):
+        value = heuristic(state, problem)
+        entry = table.lookup(signature, state_hash(state))
+        return value if entry is None else max(value, entry[2])
+    return bounded
 
 
-def a_star_search(problem, heuristic=null_heuristic):
+def _store_solution(table, signature, problem, path_node, total, actions, best_g, explored):
     """
-    Search the node that has the lowest combined cost and heuristic first.
+    Stores in <table> what an optimal search that found <actions>, of cost
+    <total>, proved: the rest of the plan is optimal from <path_node> and
+    every state above it, and a state reached at cost g cannot reach a goal
+    for less than <total> minus g.
     """
+    for state in explored:
+        if total > best_g[state]:
+            table.store_lower_bound(signature, state_hash(state), total - best_g[state])
+    # Plans last, so that they are the most recently used entries of a full table
+    codes = [problem.encode_action(action) for action in actions]
+    node = path_node
+    while node is not None:
+        table.store_plan(signature, state_hash(node.state), total - node.cost, codes[node.depth:])
+        node = node.parent
+    table.flush()
+
+
+def focal_search(problem, heuristic=null_heuristic, w=1.5, focal_heuristic=None, stats=None):
+    """
+    A*-epsilon: like A*, but instead of the node with the lowest
+    f = cost + heuristic it expands, among the nodes whose f is within w
+    times the lowest f on the frontier (the focal list), the one with the
+    lowest <focal_heuristic> (by default the heuristic itself, i.e. the node
+    that looks closest to a goal).
+
+    Since some node on an optimal path is always on the frontier with f at
+    most the optimal cost, every node allowed into the focal list, and so
+    the solution found, costs at most w times the optimum when the heuristic
+    is admissible.
+
+    The frontier is two heaps over the same nodes: open, by f, to find the
+    lowest f, and focal, by <focal_heuristic>. Nodes whose f is still above
+    the focal threshold wait in a third heap by f, and are let into focal as
+    the threshold rises. Expanded and out of date entries are dropped lazily.
+
+    w must be at least 1, or the node with the lowest f would never be in
+    the focal list.
+    """
+    if w < 1:
+        raise ValueError('focal search needs a weight of at least 1, got %r' % w)
+    if stats is None:
+        stats = SearchStats()
+    heuristic = stats.timed_heuristic(heuristic)
+    focal_heuristic = heuristic if focal_heuristic is None else stats.timed_heuristic(focal_heuristic)
+
+    counter = itertools.count()
+    open_heap = []
+    focal = []
+    waiting = []
+    best_g = {}
+    closed = {}
+
+    def is_live(node):
+        return node.cost <= best_g[node.state] and closed.get(node.state, float('inf')) > node.cost
+
+    def lowest_f():
+        with stats.timer('queue'):
+            while open_heap and not is_live(open_heap[0][2]):
+                heapq.heappop(open_heap)
+        return open_heap[0][0] if open_heap else None
+
+    def push(node, f_min):
+        f = node.cost + heuristic(node.state, problem)
+        entry = (f, next(counter), node)
+        if f_min is None or f <= w * f_min:
+            focal_entry = (focal_heuristic(node.state, problem), entry[1], node, f)
+            with stats.timer('queue'):
+                heapq.heappush(open_heap, entry)
+                heapq.heappush(focal, focal_entry)
+        else:
+            with stats.timer('queue'):
+                heapq.heappush(open_heap, entry)
+                heapq.heappush(waiting, entry)
 
-    # Initialize the priority queue
-    frontier = util.PriorityQueue()
-    # Start with the initial state
     start_state = problem.get_start_state()
-    start_node = SearchNode(start_state, [], 0)
-    frontier.push(start_node, start_node.cost + heuristic(start_state, problem))
-    # Initialize an empty set for explored nodes
-    explored = set()
+    best_g[start_state] = 0
+    push(SearchNode(start_state), None)
 
-    while not frontier.isEmpty():
-        # Get the node with the lowest combined cost and heuristic
-        current_node = frontier.pop()
+    while True:
+        f_min = lowest_f()
+        if f_min is None:
+            return []
+        # Let in the nodes the (possibly risen) threshold now covers
+        while waiting and waiting[0][0] <= w * f_min:
+            with stats.timer('queue'):
+                (f, count, node) = heapq.heappop(waiting)
+            if is_live(node):
+                focal_entry = (focal_heuristic(node.state, problem), count, node, f)
+                with stats.timer('queue'):
+                    heapq.heappush(focal, focal_entry)
+        with stats.timer('queue'):
+            while focal and not is_live(focal[0][2]):
+                stats.stale_discarded += 1
+                heapq.heappop(focal)
+        if not focal:
+            # Every waiting node was out of date; f_min has moved on
+            continue
+        stats.observe(len(open_heap), len(best_g))
 
-        # Check if the state is the goal state
+        with stats.timer('queue'):
+            (_, _, current_node, _) = heapq.heappop(focal)
         if problem.is_goal_state(current_node.state):
-            return current_node.actions
+            stats.lower_bound = f_min
+            stats.suboptimality_bound = max(1.0, current_node.cost / f_min) if f_min > 0 else w
+            return current_node.get_actions()
+
+        if current_node.state in closed:
+            stats.reexpansions += 1
+        closed[current_node.state] = current_node.cost
+
+        for next_state, action, step_cost in stats.successors(problem, current_node):
+            new_cost = current_node.cost + step_cost
+            if new_cost >= best_g.get(next_state, float('inf')):
+                stats.duplicates_pruned += 1
+                continue
+            best_g[next_state] = new_cost
+            push(SearchNode(next_state, current_node, action, new_cost), f_min)
+
+
+def beam_search(problem, heuristic=null_heuristic, width=100, stats=None, bound=float('inf'), deadline=None):
+    """
+    Breadth first search that only keeps the <width> nodes of lowest
+    cost + heuristic at every depth, so its time and memory grow linearly
+    with the depth.
+
+    Goals are recognized when generated, and the search carries on until the
+    beam runs dry, pruning nodes that cannot beat the cheapest solution found
+    (or <bound>, if given), and returns the cheapest solution. With a
+    <deadline> (a time.time() value) it stops there and returns the best
+    solution so far.
+
+    Any solution costs at least the f of some node the beam cut, pruned or
+    did not get to, so the lowest of those, capped by the solution's cost,
+    is a lower bound on the optimum, stored in stats.lower_bound along with
+    the resulting suboptimality_bound. A lower bound equal to the solution's
+    cost proves it optimal; one of at least <bound> with no solution proves
+    that nothing cheaper than <bound> exists.
+    """
+    if stats is None:
+        stats = SearchStats()
+    heuristic = stats.timed_heuristic(heuristic)
+
+    start_state = problem.get_start_state()
+    best_g = {start_state: 0}
+    best_node = None
+    lower_bound = float('inf')
+    beam = [SearchNode(start_state)]
+    if problem.is_goal_state(start_state):
+        (best_node, bound) = (beam[0], 0)
+        beam = []
+
+    while beam:
+        candidates = []
+        for (i, node) in enumerate(beam):
+            if deadline is not None and time.time() >= deadline:
+                # What was not looked at yet is cut too
+                lower_bound = min([lower_bound] + [f for (f, _) in candidates] +
+                                  [n.cost + heuristic(n.state, problem) for n in beam[i:]])
+                candidates = []
+                break
+            for next_state, action, step_cost in stats.successors(problem, node):
+                new_cost = node.cost + step_cost
+                if new_cost >= best_g.get(next_state, float('inf')):
+                    stats.duplicates_pruned += 1
+                    continue
+                best_g[next_state] = new_cost
+                f = new_cost + heuristic(next_state, problem)
+                if f >= bound:
+                    lower_bound = min(lower_bound, f)
+                    continue
+                child = SearchNode(next_state, node, action, new_cost)
+                if problem.is_goal_state(next_state):
+                    (best_node, bound) = (child, new_cost)
+                else:
+                    candidates.append((f, child))
+
+        # Nodes added before a cheaper solution turned up may no longer beat it
+        with stats.timer('queue'):
+            candidates = [(f, child) for (f, child) in candidates if f < bound]
+            candidates.sort(key=lambda candidate: candidate[0])
+        stats.observe(len(candidates), len(best_g))
+        if len(candidates) > width:
+            lower_bound = min(lower_bound, candidates[width][0])
+        beam = [child for (_, child) in candidates[:width]]
+
+    if best_node is None:
+        stats.lower_bound = lower_bound
+        return []
+    stats.lower_bound = min(lower_bound, best_node.cost)
+    if best_node.cost == 0:
+        stats.suboptimality_bound = 1.0
+    elif stats.lower_bound > 0:
+        stats.suboptimality_bound = best_node.cost / stats.lower_bound
+    else:
+        stats.suboptimality_bound = float('inf')
+    return best_node.get_actions()
+
+
+def iterative_deepening_a_star_search(problem, heuristic=null_heuristic, stats=None):
+    """
+    IDA*: repeated depth first searches, each cut off at a cost + heuristic
+    bound that grows to the smallest value that exceeded it in the previous
+    round.
+
+    Only the current path and its unexplored siblings are kept in memory
+    (combine it with a problem's lazy successors to keep those cheap), at the
+    price of re-expanding the shallow part of the tree on every round.
+    Returns an optimal plan for an admissible heuristic.
+    """
+    if stats is None:
+        stats = SearchStats()
+    heuristic = stats.timed_heuristic(heuristic)
+
+    start_state = problem.get_start_state()
+    bound = heuristic(start_state, problem)
+    while True:
+        next_bound = float('inf')
+        stack = [SearchNode(start_state)]
+        while stack:
+            stats.observe(len(stack))
+            with stats.timer('queue'):
+                current_node = stack.pop()
+            f = current_node.cost + heuristic(current_node.state, problem)
+            if f > bound:
+                next_bound = min(next_bound, f)
+                continue
+
+            if problem.is_goal_state(current_node.state):
+                return current_node.get_actions()
+
+            # Push in reverse so successors are tried in the order they were generated
+            for next_state, action, step_cost in reversed(stats.successors(problem, current_node)):
+                if not _on_path(current_node, next_state):
+                    stack.append(SearchNode(next_state, current_node, action, current_node.cost + step_cost))
+                else:
+                    stats.duplicates_pruned += 1
+
+        if next_bound == float('inf'):
+            # Nothing was cut off, so the whole space was searched
+            return []
+        bound = next_bound
+
+
+def _on_path(node, state):
+    """
+    Returns True if <state> is the state of <node> or one of its ancestors.
+    """
+    while node is not None:
+        if node.state == state:
+            return True
+        node = node.parent
+    return False
+
+
+class _MemoryNode:
+    """
+    A node of simplified_memory_bounded_a_star_search.
+
+    f is the backed-up lower bound on the cost of a goal below the node,
+    children maps each successor state still in memory to its node, and
+    forgotten_f is the best f among the children that were dropped.
+    """
+    __slots__ = ('state', 'parent', 'action', 'cost', 'depth', 'f', 'children', 'forgotten_f', 'expanded',
+                 'version')
+
+    def __init__(self, state, parent, action, cost, f):
+        self.state = state
+        self.parent = parent
+        self.action = action
+        self.cost = cost
+        self.depth = 0 if parent is None else parent.depth + 1
+        self.f = f
+        self.children = {}
+        self.forgotten_f = float('inf')
+        self.expanded = False
+        self.version = 0
+
+    def get_actions(self):
+        actions = [None] * self.depth
+        node = self
+        while node.parent is not None:
+            actions[node.depth - 1] = node.action
+            node = node.parent
+        return actions
+
+    def open_f(self):
+        """
+        The f this node is expanded at: its own f until it is expanded, then
+        the f of its best forgotten child.
+        """
+        return self.forgotten_f if self.expanded else self.f
+
+
+def estimate_node_bytes(state):
+    """
+    A rough estimate of the memory one search node holding <state> takes,
+    used to turn a byte budget into a node budget.
+    """
+    size = sys.getsizeof(state)
+    for value in getattr(state, '__dict__', {}).values():
+        size += sys.getsizeof(value)
+    return size
+
+
+def simplified_memory_bounded_a_star_search(problem, heuristic=null_heuristic, max_nodes=100000, max_bytes=None,
+                                            stats=None):
+    """
+    SMA*: A* that never keeps more than <max_nodes> nodes in memory (or as
+    many as fit in <max_bytes>, by estimate_node_bytes of the start state).
 
-        # If the state has not been explored yet
-        if current_node.state not in explored:
-            explored.add(current_node.state)
+    When memory is full, the leaf with the highest f is dropped and its f is
+    backed up into its parent, which is expanded again - regenerating the
+    forgotten successors - once that f is the lowest left. This is the
+    variant that regenerates all missing successors of a node at once, so the
+    budget must fit a full expansion plus the current path. A successor whose
+    state is already in memory at an equal or lower cost is not generated
+    again. Returns an optimal plan for an admissible heuristic if one fits in
+    memory.
+    """
+    if stats is None:
+        stats = SearchStats()
+
+    heuristic = stats.timed_heuristic(heuristic)
+
+    start_state = problem.get_start_state()
+    if max_bytes is not None:
+        max_nodes = min(max_nodes, max(2, max_bytes // estimate_node_bytes(start_state)))
+
+    counter = itertools.count()
+    # Lazily invalidated heaps: entries whose version is outdated are skipped
+    best_heap = []
+    worst_heap = []
+
+    def schedule(node):
+        node.version += 1
+        if node.open_f() < float('inf'):
+            heapq.heappush(best_heap, (node.open_f(), -node.depth, next(counter), node.version, node))
+        if not node.children and node.parent is not None:
+            heapq.heappush(worst_heap, (-node.f, node.depth, next(counter), node.version, node))
+
+    def back_up(node):
+        while node is not None:
+            new_f = min([child.f for child in node.children.values()] + [node.forgotten_f])
+            if node.expanded and new_f != node.f:
+                node.f = new_f
+                schedule(node)
+                node = node.parent
+            else:
+                schedule(node)
+                break
 
-            # Expand the node
-            for next_state, action, step_cost in problem.get_successors(current_node.state):
-                new_cost = current_node.cost + step_cost
-                new_actions = current_node.actions + [action]
-                new_node = SearchNode(next_state, new_actions, new_cost)
-                frontier.push(new_node, new_node.cost + heuristic(next_state, problem))
+    root = _MemoryNode(start_state, None, None, 0, heuristic(start_state, problem))
+    schedule(root)
+    in_memory = 1
+    # The cheapest node in memory for every state
+    by_state = {start_state: root}
+
+    while best_heap:
+        with stats.timer('queue'):
+            (open_f, _, _, version, node) = heapq.heappop(best_heap)
+        if version != node.version or node.open_f() != open_f or (node.parent is not None and
+                                                                   node.parent.children.get(node.state) is not node):
+            continue
+
+        if problem.is_goal_state(node.state):
+            return node.get_actions()
+
+        if node.expanded:
+            stats.reexpansions += 1
+        for next_state, action, step_cost in stats.successors(problem, node):
+            if next_state in node.children:
+                continue
+            cost = node.cost + step_cost
+            other = by_state.get(next_state)
+            if other is not None and other.cost <= cost:
+                stats.duplicates_pruned += 1
+                continue
+            if node.depth + 1 >= max_nodes - 1 and not problem.is_goal_state(next_state):
+                # No room left for anything below this successor
+                child_f = float('inf')
+            else:
+                child_f = max(open_f, cost + heuristic(next_state, problem))
+            child = _MemoryNode(next_state, node, action, cost, child_f)
+            node.children[next_state] = child
+            by_state[next_state] = child
+            schedule(child)
+            in_memory += 1
+        node.expanded = True
+        node.forgotten_f = float('inf')
+        back_up(node)
+        stats.observe(in_memory, len(by_state))
+
+        # Drop the worst leaves until we are back under budget
+        while in_memory > max_nodes and worst_heap:
+            (_, _, _, version, worst) = heapq.heappop(worst_heap)
+            parent = worst.parent
+            if version != worst.version or worst.children or parent.children.get(worst.state) is not worst:
+                continue
+            del parent.children[worst.state]
+            if by_state.get(worst.state) is worst:
+                del by_state[worst.state]
+            worst.version += 1
+            in_memory -= 1
+            stats.forgotten += 1
+            parent.forgotten_f = min(parent.forgotten_f, worst.f)
+            back_up(parent)
 
     # If no solution is found, return failure
     return []
 
 
+def parallel_a_star_search(problem, heuristic=null_heuristic, num_workers=None, stats=None):
+    """
+    Hash-distributed A* (HDA*) over <num_workers> processes (default: one per
+    CPU).
+
+    Every state is owned by worker hash(state) % num_workers, which keeps the
+    open list and best costs for the states it owns; successors are sent to
+    their owner through its queue. Workers share the cost of the best plan
+    found so far and drop anything whose f cannot beat it. The search ends
+    when every worker is idle and every sent successor has been received,
+    and returns the same optimal cost a_star_search would.
+
+    A successor is sent with the action that reached it and an (owner, node
+    id) reference to its parent, and the plan is only rebuilt once the search
+    is over, by following the references of the best goal back through the
+    workers. States must hash the same way in every process (Blokus boards
+    use a seeded Zobrist hash). If the problem provides
+    get_state_after(actions), the owner rebuilds the state instead of
+    receiving it pickled, so those messages carry the O(depth) action path
+    from the start state; for Blokus, where the depth is at most the number
+    of pieces, replaying it is much cheaper than pickling a board.
+
+    If a worker raises or dies, the other workers are stopped and a
+    RuntimeError with its traceback is raised. problem.expanded is increased
+    by the workers' expansions, stats holds the sum of the workers' counters
+    and stats.worker_expanded shows the load balance.
+    """
+    if stats is None:
+        stats = SearchStats()
+    if num_workers is None:
+        num_workers = multiprocessing.cpu_count()
+
+    if 'fork' in multiprocessing.get_all_start_methods():
+        context = multiprocessing.get_context('fork')
+    else:
+        context = multiprocessing.get_context()
+    inboxes = [context.Queue() for _ in range(num_workers)]
+    results = context.Queue()
+    incumbent = context.Value('d', float('inf'))
+    sent = context.Value('q', 0)
+    received = context.Value('q', 0)
+    idle = context.Array('b', [0] * num_workers)
+    done = context.Event()
+
+    start_state = problem.get_start_state()
+    send_states = not hasattr(problem, 'get_state_after')
+    sent.value = 1
+    inboxes[hash(start_state) % num_workers].put((0, heuristic(start_state, problem), 0, None, None,
+                                                  start_state if send_states else ()))
+
+    workers = [context.Process(target=_parallel_a_star_worker,
+                               args=(worker_id, problem, heuristic, send_states, inboxes, results, incumbent,
+                                     sent, received, idle, done))
+               for worker_id in range(num_workers)]
+    for worker in workers:
+        worker.start()
+
+    best_cost = float('inf')
+    best_goal = None
+
+    def handle(message):
+        # Keeps the best goal reported, and fails if a worker did
+        nonlocal best_cost, best_goal
+        if message[0] == 'error':
+            (_, worker_id, trace) = message
+            _stop_workers(workers, done)
+            raise RuntimeError('parallel A* worker %d failed:\n%s' % (worker_id, trace))
+        if message[0] == 'plan':
+            (_, cost, goal) = message
+            if cost < best_cost:
+                (best_cost, best_goal) = (cost, goal)
+            return None
+        return message
+
+    def next_message():
+        # The next message other than a goal, waiting for it as long as no worker failed
+        while True:
+            try:
+                message = handle(results.get(timeout=0.1))
+            except queue.Empty:
+                _check_workers(workers, done)
+                continue
+            if message is not None:
+                return message
+
+    # Termination: no worker has work, and the message counters did not move
+    # while we looked at the idle flags
+    while True:
+        time.sleep(0.01)
+        try:
+            while True:
+                handle(results.get_nowait())
+        except queue.Empty:
+            pass
+        _check_workers(workers, done)
+        (sent_before, received_before) = (sent.value, received.value)
+        if sent_before != received_before or not all(idle):
+            continue
+        if sent.value == sent_before and received.value == received_before:
+            done.set()
+            break
+
+    # Every worker sends its counters once it has left the search
+    worker_expanded = [0] * num_workers
+    for _ in range(num_workers):
+        (_, worker_id, worker_stats) = next_message()
+        worker_expanded[worker_id] = worker_stats.expanded
+        stats.merge(worker_stats)
+
+    # and then answers for its nodes: ask the owners of the best goal's
+    # ancestors for their actions
+    plan = []
+    node = best_goal
+    while node is not None:
+        (owner, node_id) = node
+        inboxes[owner].put(node_id)
+        (_, node, action) = next_message()
+        if node is not None:
+            plan.append(action)
+    plan.reverse()
+
+    for inbox in inboxes:
+        inbox.put(None)
+    for worker in workers:
+        worker.join()
+
+    stats.worker_expanded = worker_expanded
+    problem.expanded += sum(worker_expanded)
+    return plan
+
+
+def _check_workers(workers, done):
+    """
+    Raises a RuntimeError, after stopping the others, if one of the workers
+    of parallel_a_star_search died without reporting an error.
+    """
+    for worker_id, worker in enumerate(workers):
+        if worker.exitcode is not None and worker.exitcode != 0:
+            _stop_workers(workers, done)
+            raise RuntimeError('parallel A* worker %d died with exit code %d' % (worker_id, worker.exitcode))
+
+
+def _stop_workers(workers, done):
+    done.set()
+    for worker in workers:
+        if worker.is_alive():
+            worker.terminate()
+    for worker in workers:
+        worker.join()
+
+
+def _parallel_a_star_worker(worker_id, problem, heuristic, send_states, inboxes, results, incumbent, sent, received,
+                            idle, done):
+    """
+    One worker of parallel_a_star_search. Successor messages are
+    (g, h, depth, parent, action, payload) tuples, where parent is the
+    (owner, node id) of the node they were generated from (None for the start
+    state) and payload is the state, or the action path to rebuild it from.
+    Once the search is done, the worker sends its stats, then answers node
+    id messages with ('node', parent, action) until it gets None.
+    """
+    try:
+        _parallel_a_star_work(worker_id, problem, heuristic, send_states, inboxes, results, incumbent, sent,
+                              received, idle, done)
+    except Exception:
+        results.put(('error', worker_id, traceback.format_exc()))
+
+
+def _parallel_a_star_work(worker_id, problem, heuristic, send_states, inboxes, results, incumbent, sent, received,
+                          idle, done):
+    num_workers = len(inboxes)
+    inbox = inboxes[worker_id]
+    frontier = []
+    best_g = {}
+    nodes = []  # (parent, action) by node id
+    counter = itertools.count()
+    stats = SearchStats()
+    heuristic = stats.timed_heuristic(heuristic)
+
+    def add(g, h, depth, parent, action, state, path):
+        if g >= best_g.get(state, float('inf')):
+            stats.duplicates_pruned += 1
+            return
+        best_g[state] = g
+        nodes.append((parent, action))
+        with stats.timer('queue'):
+            heapq.heappush(frontier, (g + h, -g, next(counter), g, depth, len(nodes) - 1, state, path))
+        stats.observe(len(frontier), len(best_g))
+
+    def receive(message):
+        # Flag ourselves busy before the message counts as received
+        idle[worker_id] = 0
+        with received.get_lock():
+            received.value += 1
+        (g, h, depth, parent, action, payload) = message
+        if send_states:
+            add(g, h, depth, parent, action, payload, None)
+        else:
+            add(g, h, depth, parent, action, problem.get_state_after(payload), payload)
+
+    while not done.is_set():
+        try:
+            while True:
+                receive(inbox.get_nowait())
+        except queue.Empty:
+            pass
+
+        # Drop entries a cheaper path has replaced
+        with stats.timer('queue'):
+            while frontier and frontier[0][3] > best_g[frontier[0][6]]:
+                stats.stale_discarded += 1
+                heapq.heappop(frontier)
+
+        if not frontier or frontier[0][0] >= incumbent.value:
+            idle[worker_id] = 1
+            try:
+                receive(inbox.get(timeout=0.01))
+            except queue.Empty:
+                pass
+            continue
+
+        with stats.timer('queue'):
+            (_, _, _, g, depth, node_id, state, path) = heapq.heappop(frontier)
+        if problem.is_goal_state(state):
+            with incumbent.get_lock():
+                if g < incumbent.value:
+                    incumbent.value = g
+                    results.put(('plan', g, (worker_id, node_id)))
+            continue
+
+        with stats.timer('successors'):
+            successors = problem.get_successors(state)
+        stats.record_expansion(depth, len(successors))
+        for next_state, action, step_cost in successors:
+            next_g = g + step_cost
+            next_h = heuristic(next_state, problem)
+            if next_g + next_h >= incumbent.value:
+                continue
+            next_path = None if send_states else path + (action,)
+            owner = hash(next_state) % num_workers
+            if owner == worker_id:
+                add(next_g, next_h, depth + 1, (worker_id, node_id), action, next_state, next_path)
+            else:
+                with sent.get_lock():
+                    sent.value += 1
+                inboxes[owner].put((next_g, next_h, depth + 1, (worker_id, node_id), action,
+                                    next_state if send_states else next_path))
+
+    results.put(('stats', worker_id, stats))
+    while True:
+        node_id = inbox.get()
+        if node_id is None:
+            break
+        (parent, action) = nodes[node_id]
+        results.put(('node', parent, action))
+
+
 # Abbreviations
 bfs = breadth_first_search
 dfs = depth_first_search
+dfs_undo = depth_first_search_undo
 astar = a_star_search
 ucs = uniform_cost_search
+idastar = iterative_deepening_a_star_search
+smastar = simplified_memory_bounded_a_star_search
+pastar = parallel_a_star_search
+wastar = weighted_astar = weighted_a_star_search
+focal = focal_search
+beam = beam_search
@@ -0,0 +1,196 @@
+"""
+Batched self-play: many 4-player games between random agents, run across a
+process pool without a display, with the scores aggregated per seat and per
+opening (player 1's first move).
+
+The agents are IncrementalRandomInputs, which update their legal moves
+from the previous turn instead of generating them again, on the bitboard
+engine by default.
+
+    python selfplay.py -n 2000 -w 4 --json selfplay.json
+"""
+
+import json
+import math
+import multiprocessing
+import random
+import time
+
+from displays import NoDisplay
+from game import GameEngine
+from inputs import IncrementalRandomInput
+from pieces import PieceList
+
+NUM_PLAYERS = 4
+
+
+def play_games(seeds, board_w, board_h, pieces_file, engine):
+    """
+    Plays one game per seed and returns a (scores, opening) pair for each,
+    where opening is player 1's first move as (piece, orientation, x, y),
+    or None if they passed at once.
+    """
+    piece_list = PieceList(pieces_file)
+    results = []
+    for seed in seeds:
+        rng = random.Random(seed)
+        inputs = [IncrementalRandomInput(rng) for _ in range(NUM_PLAYERS)]
+        game = GameEngine(inputs, board_w, board_h, piece_list, NoDisplay(), engine)
+        scores = game.play_game(verbose=False)
+        opening = None
+        for (player, move) in game.history:
+            if player == 0:
+                opening = (move.piece_index, move.orientation_id, move.x, move.y)
+                break
+        results.append((list(scores), opening))
+    return results
+
+
+class SelfPlayStats:
+    """
+    Score statistics over a batch of games.
+
+    - games: the number of games
+    - scores: per seat, the list of its scores
+    - wins: per seat, the games it won, ties counting as a fraction
+    - openings: {opening: [games, player 1's score total, player 1's wins]}
+    - seconds: the wall time of the batch
+    """
+
+    def __init__(self):
+        self.games = 0
+        self.scores = [[] for _ in range(NUM_PLAYERS)]
+        self.wins = [0.0] * NUM_PLAYERS
+        self.openings = {}
+        self.seconds = 0.0
+
+    def add(self, scores, opening):
+        self.games += 1
+        for (player, score) in enumerate(scores):
+            self.scores[player].append(score)
+        best = max(scores)
+        winners = [player for (player, score) in enumerate(scores) if score == best]
+        for player in winners:
+            self.wins[player] += 1.0 / len(winners)
+
+        entry = self.openings.setdefault(opening, [0, 0, 0.0])
+        entry[0] += 1
+        entry[1] += scores[0]
+        if 0 in winners:
+            entry[2] += 1.0 / len(winners)
+
+    def seat_summary(self, player):
+        scores = self.scores[player]
+        if not scores:
+            return {'mean': 0.0, 'stdev': 0.0, 'min': 0, 'max': 0, 'win_rate': 0.0}
+        mean = sum(scores) / len(scores)
+        variance = sum((score - mean) ** 2 for score in scores) / max(1, len(scores) - 1)
+        return {'mean': mean, 'stdev': math.sqrt(variance), 'min': min(scores), 'max': max(scores),
+                'win_rate': self.wins[player] / len(scores)}
+
+    def best_openings(self, count=10, min_games=1):
+        """
+        Returns up to <count> (opening, games, mean score, win rate) tuples of
+        the openings played at least <min_games> times, best mean score first.
+        """
+        rows = [(opening, games, total / games, wins / games)
+                for (opening, (games, total, wins)) in self.openings.items() if games >= min_games]
+        rows.sort(key=lambda row: (-row[2], -row[1]))
+        return rows[:count]
+
+    def as_dict(self):
+        return {
+            'games': self.games,
+            'seconds': self.seconds,
+            'games_per_second': self.games / self.seconds if self.seconds else 0.0,
+            'seats': [self.seat_summary(player) for player in range(NUM_PLAYERS)],
+            'openings': [{'piece': opening[0], 'orientation': opening[1], 'x': opening[2], 'y': opening[3],
+                          'games': games, 'mean_score': mean, 'win_rate': win_rate}
+                         for (opening, games, mean, win_rate) in self.best_openings(len(self.openings))
+                         if opening is not None],
+        }
+
+    def __str__(self):
+        out_str = ["%d games in %.1f s (%.1f games/s)" %
+                   (self.games, self.seconds, self.games / self.seconds if self.seconds else 0.0)]
+        for player in range(NUM_PLAYERS):
+            summary = self.seat_summary(player)
+            out_str.append("Player %d: mean %.2f, stdev %.2f, min %d, max %d, win rate %.3f" %
+                           (player + 1, summary['mean'], summary['stdev'], summary['min'], summary['max'],
+                            summary['win_rate']))
+        return '\n'.join(out_str)
+
+
+def self_play(num_games, board_w=20, board_h=20, pieces_file='valid_pieces.txt', engine='bitboard',
+              num_workers=None, seed=0, chunk_size=20):
+    """
+    Plays <num_games> games on <num_workers> processes (default: one per
+    CPU), <chunk_size> games per task, and returns their SelfPlayStats.
+    Game i is seeded with <seed> + i, so a batch can be replayed exactly.
+    """
+    if num_workers is None:
+        num_workers = multiprocessing.cpu_count()
+    if 'fork' in multiprocessing.get_all_start_methods():
+        context = multiprocessing.get_context('fork')
+    else:
+        context = multiprocessing.get_context()
+
+    seeds = list(range(seed, seed + num_games))
+    chunks = [seeds[i:i + chunk_size] for i in range(0, num_games, chunk_size)]
+    stats = SelfPlayStats()
+    start = time.perf_counter()
+    if num_workers == 1:
+        for chunk in chunks:
+            for (scores, opening) in play_games(chunk, board_w, board_h, pieces_file, engine):
+                stats.add(scores, opening)
+    else:
+        with context.Pool(num_workers) as pool:
+            tasks = [pool.apply_async(play_games, (chunk, board_w, board_h, pieces_file, engine)) for chunk in chunks]
+            for task in tasks:
+                for (scores, opening) in task.get():
+                    stats.add(scores, opening)
+    stats.seconds = time.perf_counter() - start
+    return stats
+
+
+def main():
+    """
+    Processes the command used to run self-play from the command line.
+    """
+    from optparse import OptionParser
+    usage_str = """
+    USAGE:      python selfplay.py <options>
+    EXAMPLES:  (1) python selfplay.py -n 1000
+                  - plays 1000 random games on a 20x20 board on every CPU
+               (2) python selfplay.py -n 200 -s 14 14 -w 2 --json selfplay.json
+    """
+    parser = OptionParser(usage_str)
+    parser.add_option('-n', '--games', dest='games', type='int', help='the number of games to play', default=100)
+    parser.add_option('-p', '--pieces', dest='pieces_file',
+                      help='the file to read for the list of pieces', default='valid_pieces.txt')
+    parser.add_option('-s', '--board-size', dest='size',
+                      type='int', nargs=2, help='the size of the game board.', default=(20, 20))
+    parser.add_option('-e', '--engine', dest='engine', help='the board engine to play on', type='choice',
+                      choices=['array', 'bitboard'], default='bitboard')
+    parser.add_option('-w', '--workers', dest='workers', type='int',
+                      help='the number of processes to play on (default: one per CPU)', default=None)
+    parser.add_option('--seed', dest='seed', type='int', help='the seed of the first game', default=0)
+    parser.add_option('-o', '--openings', dest='openings', type='int',
+                      help='the number of best openings to print', default=5)
+    parser.add_option('--json', dest='json_file', metavar='FILE', help='write the statistics as JSON to FILE')
+
+    options, _ = parser.parse_args()
+    stats = self_play(options.games, options.size[1], options.size[0], options.pieces_file, options.engine,
+                      options.workers, options.seed)
+    print(stats)
+    for (opening, games, mean, win_rate) in stats.best_openings(options.openings, min_games=2):
+        if opening is not None:
+            print("Opening piece %d orientation %d at (%d, %d): %d games, mean score %.2f, win rate %.3f" %
+                  (opening + (games, mean, win_rate)))
+    if options.json_file is not None:
+        with open(options.json_file, 'w') as f:
+            json.dump(stats.as_dict(), f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
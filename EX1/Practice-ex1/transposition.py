@@ -0,0 +1,185 @@
+"""
+A persistent transposition table for search results.
+
+Entries are keyed by a problem signature (a 64-bit digest of
+problem.get_signature(), so the same puzzle maps to the same entries in
+every run) and the hash of a state (Blokus boards hash by their seeded
+Zobrist key). An entry holds what was proven about reaching a goal from
+that state: an optimal plan and its cost, and/or a lower bound on the
+cost.
+
+The table lives in a memory-mapped file of fixed-size slots, so it
+persists across runs and never grows past the size it was created with.
+Slots are grouped in buckets of WAYS; a new entry replaces the least
+recently used entry of its bucket when the bucket is full.
+"""
+
+import hashlib
+import os
+
+import numpy as np
+
+MAGIC = b'BLOKUSTT'
+VERSION = 1
+WAYS = 4
+# The longest plan an entry holds, and the integers per encoded action
+MAX_PLAN = 24
+ACTION_SIZE = 4
+
+SOLVED = 1
+BOUNDED = 2
+
+_HEADER = np.dtype([('magic', 'S8'), ('version', '<u4'), ('action_size', '<u4'), ('max_plan', '<u4'),
+                    ('num_slots', '<u8'), ('clock', '<u8')])
+_SLOT = np.dtype([('signature', '<u8'), ('state', '<u8'), ('stamp', '<u8'), ('flags', 'u1'),
+                  ('plan_length', 'u1'), ('cost', '<f8'), ('lower_bound', '<f8'),
+                  ('plan', '<u2', (MAX_PLAN, ACTION_SIZE))])
+_HEADER_BYTES = 64
+
+
+def problem_signature(problem):
+    """
+    Returns the 64-bit signature of <problem>, from its get_signature().
+    """
+    digest = hashlib.blake2b(repr(problem.get_signature()).encode(), digest_size=8).digest()
+    return int.from_bytes(digest, 'little') or 1
+
+
+def state_hash(state):
+    """
+    The hash a state is stored under, as an unsigned 64-bit integer. Boards
+    are stored under their own Zobrist hash rather than hash(), which is
+    shared by mirror images under symmetry reduction, since a stored plan
+    only applies to the board it was found from.
+    """
+    key = getattr(state, 'zobrist', None)
+    return (hash(state) if key is None else key) & 0xFFFFFFFFFFFFFFFF
+
+
+class TranspositionTable:
+    """
+    A memory-mapped table of (signature, state) -> (plan, cost, lower bound).
+
+    Opens the table at <path>, creating it with <num_slots> slots (rounded up
+    to a multiple of WAYS) if it does not exist; an existing table keeps its
+    own size. Plans are stored as problem.encode_action codes: ACTION_SIZE
+    integers below 65536 per action. hits and misses count lookups.
+    """
+
+    def __init__(self, path, num_slots=1 << 16):
+        num_slots = max(WAYS, -(-num_slots // WAYS) * WAYS)
+        if not os.path.exists(path) or os.path.getsize(path) == 0:
+            with open(path, 'wb') as f:
+                f.truncate(_HEADER_BYTES + num_slots * _SLOT.itemsize)
+            header = np.memmap(path, _HEADER, 'r+', 0, 1)
+            header[0] = (MAGIC, VERSION, ACTION_SIZE, MAX_PLAN, num_slots, 0)
+            header.flush()
+        else:
+            header = np.memmap(path, _HEADER, 'r+', 0, 1)
+            if (header[0]['magic'] != MAGIC or header[0]['version'] != VERSION or
+                    header[0]['max_plan'] != MAX_PLAN or header[0]['action_size'] != ACTION_SIZE):
+                raise ValueError('%s is not a transposition table of this version' % path)
+        self.path = path
+        self._header = header
+        self.num_slots = int(header[0]['num_slots'])
+        self.num_buckets = self.num_slots // WAYS
+        self._slots = np.memmap(path, _SLOT, 'r+', _HEADER_BYTES, (self.num_buckets, WAYS))
+        self.hits = 0
+        self.misses = 0
+
+    def _tick(self):
+        clock = int(self._header[0]['clock']) + 1
+        self._header[0]['clock'] = clock
+        return clock
+
+    def _find(self, signature, state):
+        """
+        Returns (bucket, way) of the entry, or (bucket, None) if there is none.
+        """
+        bucket = (signature ^ state) % self.num_buckets
+        slots = self._slots[bucket]
+        for way in range(WAYS):
+            if slots[way]['flags'] and slots[way]['state'] == state and slots[way]['signature'] == signature:
+                return bucket, way
+        return bucket, None
+
+    def lookup(self, signature, state):
+        """
+        Returns (cost, plan codes, lower bound) stored for <state> (a
+        state_hash) of the problem with <signature>: cost and plan are None
+        unless a plan was stored, and the lower bound is 0 if none was.
+        Returns None if the state has no entry.
+        """
+        (bucket, way) = self._find(signature, state)
+        if way is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        slot = self._slots[bucket, way]
+        self._slots[bucket, way]['stamp'] = self._tick()
+        lower_bound = float(slot['lower_bound']) if slot['flags'] & BOUNDED else 0.0
+        if not slot['flags'] & SOLVED:
+            return None, None, lower_bound
+        plan = [tuple(int(value) for value in code) for code in slot['plan'][:slot['plan_length']]]
+        return float(slot['cost']), plan, max(lower_bound, float(slot['cost']))
+
+    def _slot_for(self, signature, state):
+        """
+        Returns (bucket, way) of the entry for <state>, making one (and
+        evicting the least recently used entry of the bucket) if needed.
+        """
+        (bucket, way) = self._find(signature, state)
+        if way is None:
+            slots = self._slots[bucket]
+            empty = [w for w in range(WAYS) if not slots[w]['flags']]
+            way = empty[0] if empty else int(np.argmin(slots['stamp']))
+            self._slots[bucket, way] = np.zeros((), _SLOT)
+            self._slots[bucket, way]['signature'] = signature
+            self._slots[bucket, way]['state'] = state
+        self._slots[bucket, way]['stamp'] = self._tick()
+        return bucket, way
+
+    def store_plan(self, signature, state, cost, plan):
+        """
+        Stores the optimal <plan> (a list of action codes) of <cost> from
+        <state>. Plans longer than MAX_PLAN are not stored.
+        """
+        if len(plan) > MAX_PLAN:
+            return
+        (bucket, way) = self._slot_for(signature, state)
+        slot = self._slots[bucket, way]
+        plan_array = np.zeros((MAX_PLAN, ACTION_SIZE), np.uint16)
+        if plan:
+            plan_array[:len(plan)] = plan
+        slot['plan'] = plan_array
+        slot['plan_length'] = len(plan)
+        slot['cost'] = cost
+        slot['flags'] |= SOLVED
+        self._slots[bucket, way] = slot
+
+    def store_lower_bound(self, signature, state, lower_bound):
+        """
+        Records that reaching a goal from <state> costs at least <lower_bound>.
+        """
+        (bucket, way) = self._slot_for(signature, state)
+        slot = self._slots[bucket, way]
+        if not slot['flags'] & BOUNDED or lower_bound > slot['lower_bound']:
+            slot['lower_bound'] = lower_bound
+            slot['flags'] |= BOUNDED
+            self._slots[bucket, way] = slot
+
+    def __len__(self):
+        return int(np.count_nonzero(self._slots['flags']))
+
+    def flush(self):
+        self._slots.flush()
+        self._header.flush()
+
+    def close(self):
+        self.flush()
+        self._slots._mmap.close()
+        self._header._mmap.close()
+
+    def __str__(self):
+        return "Transposition table %s: %d of %d slots used, %d hits, %d misses" % (
+            self.path, len(self), self.num_slots, self.hits, self.misses)
@@ -4,6 +4,8 @@ class Action(object):
     Each action has a list of preconditions, an "add list" of positive effects,
     a "delete list" for negative effects, and the name of the action.
     Two actions are considered equal if they have the same name.
+    Once the domain is numbered by pgparser.index_domain, each action also has
+    an index and its pre, add and delete lists as bitsets of proposition indexes.
     """
 
     def __init__(self, name, pre, add, delete, is_noop=False):
@@ -15,6 +17,10 @@ class Action(object):
         self.delete = delete  # list of the propositions that will be deleted after applying the action
         self.name = name  # the name of the action as string
         self.noOp = is_noop  # true if the action is a noOp
+        self.index = None  # the number of the action in the domain
+        self.pre_mask = 0  # bitset of the preconditions
+        self.add_mask = 0  # bitset of the propositions added
+        self.del_mask = 0  # bitset of the propositions deleted
 
     def get_pre(self):
         return self.pre
@@ -1,52 +1,64 @@
-from util import Pair
+import numpy as np
+
+from util import iter_bits
 
 
 class ActionLayer(object):
     """
     A class for an ActionLayer in a level of the graph.
-    The layer contains a set of actions (action objects) and a set of mutex actions (Pair objects)
+    The layer contains a set of actions, kept as a bitset of their indexes (see pgparser.index_domain),
+    and the mutex relation between them, kept as a boolean matrix over all the actions of the problem:
+    mutex[i, j] is True iff actions i and j are mutex in the layer (None while there are no mutexes)
     """
+    actions = []  # all the actions of the problem (include noOp) by index (set by PlanGraphLevel.set_actions)
 
     def __init__(self):
         """
         Constructor
         """
-        self.actions = set()  # set of all the actions in the layer
-        self.mutexActions = set()  # set of pairs of action that are mutex in the layer
+        self.bits = 0  # bitset of all the actions in the layer
+        self.mutex = None  # matrix of the actions that are mutex in the layer
 
     def add_action(self, act):  # adds the action act to the actions set
-        self.actions.add(act)
+        self.bits |= 1 << act.index
 
     def remove_actions(self, act):  # removes the action act to the actions set
-        self.actions.remove(act)
+        self.bits &= ~(1 << act.index)
 
     def get_actions(self):  # returns the actions set
-        return self.actions
+        return {ActionLayer.actions[i] for i in iter_bits(self.bits)}
+
+    def get_bits(self):  # returns the bitset of the actions in the layer
+        return self.bits
+
+    def get_mutex_actions(self):  # returns the mutex actions matrix
+        if self.mutex is None:
+            n = len(ActionLayer.actions)
+            self.mutex = np.zeros((n, n), np.bool_)
+        return self.mutex
 
-    def get_mutex_actions(self):  # returns the mutex actions set
-        return self.mutexActions
+    def set_mutex_actions(self, mutex):  # sets the mutex actions matrix
+        self.mutex = mutex
 
-    def add_mutex_actions(self, a1, a2):  # add the pair (a1,a2) to the mutex actions set
-        self.mutexActions.add(Pair(a1, a2))
+    def add_mutex_actions(self, a1, a2):  # add the pair (a1,a2) to the mutex actions matrix
+        mutex = self.get_mutex_actions()
+        mutex[a1.index, a2.index] = mutex[a2.index, a1.index] = True
 
-    def is_mutex(self, pair):
+    def is_mutex(self, a1, a2):
         """
         Returns true if the pair of actions are mutex in this action layer
         """
-        return pair in self.mutexActions
+        return self.mutex is not None and bool(self.mutex[a1.index, a2.index])
 
     def effect_exists(self, prop):
         """
         Returns true if at least one of the actions in this layer has the proposition prop in its add list
         """
-        for act in self.actions:
-            if prop in act.get_add():
-                return True
-        return False
+        return self.bits & prop.producer_mask != 0
 
     def __eq__(self, other):
-        return (isinstance(other, self.__class__)
-                and self.__dict__ == other.__dict__)
+        return (isinstance(other, self.__class__) and self.bits == other.bits
+                and np.array_equal(self.get_mutex_actions(), other.get_mutex_actions()))
 
     def __ne__(self, other):
         return not self.__eq__(other)
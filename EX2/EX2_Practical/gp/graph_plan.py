@@ -1,8 +1,14 @@
-from util import Pair
-from proposition_layer import PropositionLayer
-from plan_graph_level import PlanGraphLevel
+import hashlib
+import os
+
+import numpy as np
+
+from util import bitset, iter_bits, mask_to_bits
+from no_good_table import NoGoodTable
+from plan_graph import PlanGraph
+from plan_graph_level import PlanGraphLevel, interference_matrix
 from action import Action
-from pgparser import PgParser
+from pgparser import PgParser, index_domain
 
 
 class GraphPlan(object):
@@ -10,13 +16,16 @@ class GraphPlan(object):
     A class for initializing and running the graphplan algorithm
     """
 
-    def __init__(self, _domain, _problem):
+    def __init__(self, _domain, _problem, cache_dir=None):
         """
         Constructor
+        If cache_dir is given, the interference matrix of the domain is kept there between runs
         """
-        self.independent_actions = set()
+        self.domain_file = _domain
+        self.cache_dir = cache_dir
+        self.interference = []
         self.no_goods = []
-        self.graph = []
+        self.graph = None  # the PlanGraph, see plan_graph.py
         p = PgParser(_domain, _problem)
         self.actions, self.propositions = p.parse_actions_and_propositions()
         # list of all the actions and list of all the propositions
@@ -27,11 +36,15 @@ class GraphPlan(object):
         self.create_noops()
         # creates noOps that are used to propagate existing propositions from one layer to the next
 
-        self.independent()
-        # creates independent actions set and updates self.independent_actions
-        PlanGraphLevel.set_independent_actions(self.independent_actions)
+        self.incidence = index_domain(self.actions, self.propositions)
+        self.goal_mask = bitset(self.goal)
+        # numbers the actions and propositions, so layers and goals can be bitsets and mutexes matrices
+
         PlanGraphLevel.set_actions(self.actions)
         PlanGraphLevel.set_props(self.propositions)
+        PlanGraphLevel.set_incidence(self.incidence)
+        self.independent()
+        # creates the interference matrix, sets it for all the levels and updates self.interference
 
     def graph_plan(self):
         """
@@ -42,14 +55,9 @@ class GraphPlan(object):
         init_state = self.initial_state
         level = 0
         self.no_goods = []  # make sure you update noGoods in your backward search!
-        self.no_goods.append([])
-        # create first layer of the graph, note it only has a proposition layer which consists of the initial state.
-        prop_layer_init = PropositionLayer()
-        for prop in init_state:
-            prop_layer_init.add_proposition(prop)
-        pg_init = PlanGraphLevel()
-        pg_init.set_proposition_layer(prop_layer_init)
-        self.graph.append(pg_init)
+        self.no_goods.append(NoGoodTable())  # see no_good_table.py
+        # create the graph with its first level, note it only has a proposition layer which consists of the initial state.
+        self.graph = PlanGraph(init_state)
         size_no_good = -1
 
         """
@@ -58,19 +66,16 @@ class GraphPlan(object):
         and we have not reached the fixed point, continue expanding the graph
         """
 
-        while self.goal_state_not_in_prop_layer(self.graph[level].get_proposition_layer().get_propositions()) or \
-                self.goal_state_has_mutex(self.graph[level].get_proposition_layer()):
+        while self.goal_state_not_in_prop_layer(self.graph.get_prop_bits(level)) or \
+                self.goal_state_has_mutex(self.graph.get_proposition_layer(level)):
             if self.is_fixed(level):
                 return None
                 # this means we stopped the while loop above because we reached a fixed point in the graph.
                 #  nothing more to do, we failed!
 
-            self.no_goods.append([])
+            self.no_goods.append(NoGoodTable())
             level = level + 1
-            pg_next = PlanGraphLevel()  # create new PlanGraph object
-            pg_next.expand(
-                self.graph[level - 1])  # calls the expand function, which you are implementing in the PlanGraph class
-            self.graph.append(pg_next)  # appending the new level to the plan graph
+            self.graph.extend()  # adds the next level to the plan graph
 
             size_no_good = len(self.no_goods[level])  # remember size of nogood table
 
@@ -79,10 +84,8 @@ class GraphPlan(object):
 
         while plan_solution is None:  # while we didn't extract a plan successfully
             level = level + 1
-            self.no_goods.append([])
-            pg_next = PlanGraphLevel()  # create next level of the graph by expanding
-            pg_next.expand(self.graph[level - 1])  # create next level of the graph by expanding
-            self.graph.append(pg_next)
+            self.no_goods.append(NoGoodTable())
+            self.graph.extend()  # create next level of the graph by expanding
             plan_solution = self.extract(self.graph, self.goal, level)  # try to extract a plan again
             if plan_solution is None and self.is_fixed(level):  # if failed and reached fixed point
                 if len(self.no_goods[level - 1]) == len(self.no_goods[level]):
@@ -95,16 +98,19 @@ class GraphPlan(object):
         """
         The backsearch part of graphplan that tries
         to extract a plan when all goal propositions exist in a graph plan level.
+        The sub goals that fail are added to the no-goods of the level, and sub goals with
+        a no-good of the level as a subset are not searched
         """
 
         if level == 0:
             return []
-        if sub_goals in self.no_goods[level]:
+        goals = bitset(sub_goals)
+        if goals in self.no_goods[level]:
             return None
         plan_solution = self.gp_search(graph, sub_goals, [], level)
         if plan_solution is not None:
             return plan_solution
-        self.no_goods[level].append([sub_goals])
+        self.no_goods[level].add(goals)
         return None
 
     def gp_search(self, graph, sub_goals, _plan, level):
@@ -121,15 +127,11 @@ class GraphPlan(object):
                 return new_plan + _plan
 
         prop = sub_goals[0]
-        providers = []
-        for action1 in [act for act in graph[level].get_action_layer().get_actions() if prop in act.get_add()]:
-            no_mutex = True
-            for action2 in _plan:
-                if Pair(action1, action2) not in self.independent_actions:
-                    no_mutex = False
-                    break
-            if no_mutex:
-                providers.append(action1)
+        # the actions of the level that add prop and are independent of every action in the plan
+        candidates = prop.producer_mask & graph.get_action_bits(level)
+        for action2 in _plan:
+            candidates &= ~self.interference[action2.index]
+        providers = [self.actions[i] for i in iter_bits(candidates)]
 
         plans = []
         for action in providers:
@@ -141,44 +143,31 @@ class GraphPlan(object):
                 plans.append(new_plan)
         if len(plans) > 0:
             plans_size = list(map(lambda p: len(p), plans))
-            import numpy as np
             return plans[np.argmin(plans_size)]
         return None
 
     def goal_state_not_in_prop_layer(self, propositions):
         """
-        Helper function that receives a  list of propositions (propositions) and returns true
-        if not all the goal propositions are in that list
+        Helper function that receives the bitset of a proposition layer (propositions) and returns true
+        if not all the goal propositions are in that layer
         """
-        for goal in self.goal:
-            if goal not in propositions:
-                return True
-        return False
+        return self.goal_mask & ~propositions != 0
 
     def goal_state_has_mutex(self, prop_layer):
         """
         Helper function that checks whether all goal propositions are non mutex at the current graph level
         """
-        for goal1 in self.goal:
-            for goal2 in self.goal:
-                if prop_layer.is_mutex(goal1, goal2):
-                    return True
-        return False
+        if not prop_layer.num_mutex_props():
+            return False
+        goals = [goal.index for goal in self.goal]
+        return bool(prop_layer.get_mutex_props()[np.ix_(goals, goals)].any())
 
     def is_fixed(self, level):
         """
         Checks if we have reached a fixed point, i.e. each level we'll expand would be the same,
-        thus no point in continuing
+        thus no point in continuing (see PlanGraph.is_fixed)
         """
-        if level == 0:
-            return False
-
-        if len(self.graph[level].get_proposition_layer().get_propositions()) == \
-                len(self.graph[level - 1].get_proposition_layer().get_propositions()) and \
-                len(self.graph[level].get_proposition_layer().get_mutex_props()) == \
-                len(self.graph[level - 1].get_proposition_layer().get_mutex_props()):
-            return True
-        return False
+        return self.graph.is_fixed(level)
 
     def create_noops(self):
         """
@@ -197,17 +186,25 @@ class GraphPlan(object):
 
     def independent(self):
         """
-        Creates a set of independent actions
+        Creates the interference matrix of the domain, whose entry [i, j] is True iff actions i and j
+        are not independent (see independent_pair and interference_matrix), once for all the levels,
+        loading it from self.cache_dir if it was computed there for the same domain file before.
+        self.interference[i] is row i as a bitset, for the backward search
         """
-        for i in range(len(self.actions)):
-            for j in range(i + 1, len(self.actions)):
-                act1 = self.actions[i]
-                act2 = self.actions[j]
-                if independent_pair(act1, act2):
-                    self.independent_actions.add(Pair(act1, act2))
+        matrix = None
+        path = None
+        if self.cache_dir is not None:
+            path = interference_cache_path(self.cache_dir, self.domain_file)
+            matrix = load_interference(path, len(self.actions))
+        if matrix is None:
+            matrix = interference_matrix(self.incidence)
+            if path is not None:
+                save_interference(path, matrix)
+        PlanGraphLevel.set_interference(matrix)
+        self.interference = [mask_to_bits(row) for row in matrix]
 
     def is_independent(self, a1, a2):
-        return Pair(a1, a2) in self.independent_actions
+        return a1 != a2 and not self.interference[a1.index] >> a2.index & 1
 
     @staticmethod
     def no_mutex_action_in_plan(plan_, act, action_layer):
@@ -216,11 +213,45 @@ class GraphPlan(object):
         returns true if there are no mutex actions in the plan
         """
         for plan_act in plan_:
-            if action_layer.is_mutex(Pair(plan_act, act)):
+            if action_layer.is_mutex(plan_act, act):
                 return False
         return True
 
 
+def interference_cache_path(cache_dir, domain_file):
+    """
+    Returns the file in cache_dir that holds the interference matrix of domain_file,
+    named after a digest of its contents so an edited domain gets a new one
+    """
+    with open(domain_file, 'rb') as f:
+        digest = hashlib.sha1(f.read()).hexdigest()
+    return os.path.join(cache_dir, '%s.%s.npz' % (os.path.basename(domain_file), digest[:16]))
+
+
+def load_interference(path, num_actions):
+    """
+    Returns the interference matrix saved at path, or None if there is no usable one for num_actions actions
+    """
+    try:
+        with np.load(path) as data:
+            if int(data['num_actions']) != num_actions:
+                return None
+            return np.unpackbits(data['packed'], axis=1, count=num_actions).astype(bool)
+    except (OSError, KeyError, ValueError):
+        return None
+
+
+def save_interference(path, interference):
+    """
+    Saves the interference matrix at path, bit-packed
+    """
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    temp_path = path + '.tmp'
+    with open(temp_path, 'wb') as f:
+        np.savez_compressed(f, num_actions=len(interference), packed=np.packbits(interference, axis=1))
+    os.replace(temp_path, path)
+
+
 def independent_pair(a1, a2):
     """
     Returns true if the actions are neither have inconsistent effects
@@ -259,16 +290,19 @@ if __name__ == '__main__':
     import sys
     import time
 
-    if len(sys.argv) != 1 and len(sys.argv) != 3:
-        print("Usage: graph_plan.py domain_name problem_name")
+    if len(sys.argv) not in [1, 3, 4]:
+        print("Usage: graph_plan.py domain_name problem_name [cache_dir]")
         exit()
     domain = 'dwrDomain.txt'
     problem = 'dwrProblem.txt'
-    if len(sys.argv) == 3:
+    cache = None
+    if len(sys.argv) >= 3:
         domain = str(sys.argv[1])
         problem = str(sys.argv[2])
+    if len(sys.argv) == 4:
+        cache = str(sys.argv[3])
 
-    gp = GraphPlan(domain, problem)
+    gp = GraphPlan(domain, problem, cache)
     start = time.perf_counter()
     plan = gp.graph_plan()
     elapsed = time.perf_counter() - start
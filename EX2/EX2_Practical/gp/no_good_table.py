@@ -0,0 +1,59 @@
+from util import iter_bits
+
+END = -1  # the key that marks a node of the trie where a no-good ends
+
+
+class NoGoodTable(object):
+    """
+    The no-goods of one level of the plan graph: the sets of goals the backward search failed to reach from it.
+    A set of goals is kept as the bitset of its propositions (see util.bitset), so the table is a hash set of them,
+    and the goals are also put in a trie by increasing index, to find the no-goods that are subsets of a set of goals:
+    if a subset of the goals cannot be reached from the level, neither can the goals
+    """
+
+    def __init__(self):
+        """
+        Constructor
+        """
+        self.no_goods = set()  # the bitsets of the no-goods
+        self.trie = {}  # nested dicts by proposition index, END in a node if a no-good ends there
+        self.union = 0  # the bitset of the propositions in some no-good
+
+    def add(self, goals):
+        """
+        Adds the bitset goals to the no-goods
+        """
+        if goals in self.no_goods:
+            return
+        self.no_goods.add(goals)
+        self.union |= goals
+        node = self.trie
+        for index in iter_bits(goals):
+            node = node.setdefault(index, {})
+        node[END] = True
+
+    def __contains__(self, goals):
+        """
+        Returns true if the bitset goals is a no-good or has one as a subset
+        """
+        if goals in self.no_goods:
+            return True
+        if not self.no_goods:
+            return False
+        return has_subset(self.trie, list(iter_bits(goals & self.union)), 0)
+
+    def __len__(self):  # returns the number of no-goods
+        return len(self.no_goods)
+
+
+def has_subset(node, indexes, start):
+    """
+    Returns true if a no-good under node of the trie is a subset of indexes[start:] (sorted)
+    """
+    if END in node:
+        return True
+    for i in range(start, len(indexes)):
+        child = node.get(indexes[i])
+        if child is not None and has_subset(child, indexes, i + 1):
+            return True
+    return False
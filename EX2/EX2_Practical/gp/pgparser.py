@@ -1,5 +1,8 @@
+import numpy as np
+
 from action import Action
 from proposition import Proposition
+from util import bitset
 
 
 class PgParser:
@@ -58,6 +61,7 @@ class PgParser:
             a.add = new_add
             a.delete = new_delete
 
+        self.propositions = propositions
         return [actions, propositions]
 
     @staticmethod
@@ -67,15 +71,64 @@ class PgParser:
                 return prop
 
     def parse_problem(self):
+        """
+        Returns the initial state and the goal as lists of the domain's propositions
+        (the domain is parsed first if it was not).
+        Initial state propositions the domain does not define are left out, since no action uses them,
+        and a goal the domain does not define raises a ValueError
+        """
+        if not hasattr(self, 'propositions'):
+            self.parse_actions_and_propositions()
+        by_name = {prop.name: prop for prop in self.propositions}
         init = []
         goal = []
         f = open(self.problem_file, 'r')
         line = f.readline()
         words = [word.rstrip() for word in line.split(" ") if len(word.rstrip()) > 0]
         for i in range(2, len(words)):
-            init.append(Proposition(words[i]))
+            if words[i] in by_name:
+                init.append(by_name[words[i]])
         line = f.readline()
         words = [word.rstrip() for word in line.split(" ") if len(word.rstrip()) > 0]
         for i in range(2, len(words)):
-            goal.append(Proposition(words[i]))
+            if words[i] not in by_name:
+                raise ValueError("goal proposition %s of %s is not defined in the domain %s"
+                                 % (words[i], self.problem_file, self.domain_file))
+            goal.append(by_name[words[i]])
         return init, goal
+
+
+def index_domain(actions, propositions):
+    """
+    Numbers the propositions and the actions (noOps included) of a domain
+    0, 1, ... in list order and fills in their bitsets:
+    the pre, add and delete masks of every action, and the masks of the actions
+    producing, consuming and deleting every proposition.
+    The plan graph layers are bitsets over these numbers.
+    Returns the (pre, add, delete) incidence matrices of the domain:
+    float32 arrays of 0s and 1s with a row per action and a column per proposition,
+    for PlanGraphLevel.set_incidence
+    """
+    pre = np.zeros((len(actions), len(propositions)), np.float32)
+    add = np.zeros((len(actions), len(propositions)), np.float32)
+    delete = np.zeros((len(actions), len(propositions)), np.float32)
+    for i, prop in enumerate(propositions):
+        prop.index = i
+        prop.producer_mask = 0
+        prop.consumer_mask = 0
+        prop.deleter_mask = 0
+    for i, act in enumerate(actions):
+        act.index = i
+        act.pre_mask = bitset(act.get_pre())
+        act.add_mask = bitset(act.get_add())
+        act.del_mask = bitset(act.get_delete())
+        for prop in act.get_pre():
+            prop.consumer_mask |= 1 << i
+            pre[i, prop.index] = 1
+        for prop in act.get_add():
+            prop.producer_mask |= 1 << i
+            add[i, prop.index] = 1
+        for prop in act.get_delete():
+            prop.deleter_mask |= 1 << i
+            delete[i, prop.index] = 1
+    return pre, add, delete
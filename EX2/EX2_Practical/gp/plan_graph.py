@@ -0,0 +1,241 @@
+import numpy as np
+
+from action_layer import ActionLayer
+from plan_graph_level import PlanGraphLevel
+from proposition_layer import PropositionLayer
+from util import mask_to_bits
+
+NOT_YET = np.iinfo(np.int32).max  # the first level of a proposition or action that is not in the graph yet
+FOREVER = np.iinfo(np.int32).max  # the last level of a mutex that holds in every level (interfering actions)
+NEVER = -1  # the last level of a pair that was never mutex
+
+
+class PlanGraph(object):
+    """
+    An incremental plan graph.
+    Planning graphs are monotone: propositions and actions are never removed from later levels,
+    and two propositions or actions that are not mutex in a level are not mutex in any later level.
+    So instead of a PlanGraphLevel per level, the graph records
+    - for every proposition and action, the first level it appears in (NOT_YET if it did not)
+    - for every pair of propositions and of actions, the last level they are mutex in
+      (NEVER if they never were, FOREVER for interfering actions)
+    and a proposition or action is in level k iff its first level is <= k,
+    and two of them are mutex in level k iff both are in it and their last mutex level is >= k.
+
+    extend() adds a level by only looking at what can change: the actions and propositions that are new,
+    and the pairs that were mutex in the last level because of competing needs or competing producers.
+    Once the graph levels off every later level is the same as the fixed one, so it is not recorded again.
+    It uses the incidence and interference matrices set in PlanGraphLevel.
+    """
+
+    def __init__(self, initial_state):
+        """
+        Constructor: creates the graph with level 0, whose proposition layer is the initial state
+        """
+        (pre, add, delete) = PlanGraphLevel.incidence
+        (num_actions, num_props) = pre.shape
+        self.prop_level = np.full(num_props, NOT_YET, np.int32)
+        self.action_level = np.full(num_actions, NOT_YET, np.int32)
+        self.prop_mutex_until = np.full((num_props, num_props), NEVER, np.int32)
+        self.action_mutex_until = np.full((num_actions, num_actions), NEVER, np.int32)
+        # the (i, j), i < j, pairs of the last level that are mutex but could stop being so
+        self.open_prop_pairs = (np.zeros(0, np.intp), np.zeros(0, np.intp))
+        self.open_action_pairs = (np.zeros(0, np.intp), np.zeros(0, np.intp))
+
+        for prop in initial_state:
+            self.prop_level[prop.index] = 0
+        # per level: the bitsets of its propositions and actions, and its number of proposition mutexes
+        self.prop_bits = [mask_to_bits(self.prop_level == 0)]
+        self.action_bits = [0]
+        self.num_prop_mutexes = [0]
+        self.fixed_level = None  # the first level that is the same as the level before it
+
+    def __len__(self):  # returns the number of levels
+        return len(self.prop_bits)
+
+    def extend(self):
+        """
+        Adds the next level to the graph
+        """
+        level = len(self)
+        if self.fixed_level is not None:
+            self.prop_bits.append(self.prop_bits[-1])
+            self.action_bits.append(self.action_bits[-1])
+            self.num_prop_mutexes.append(self.num_prop_mutexes[-1])
+            return
+        (pre, add, delete) = PlanGraphLevel.incidence
+        props_before = self.prop_level < level
+        prop_mutex_before = self.mutex_props(level - 1)
+
+        # The new actions: their preconditions are all in the last level, and not pairwise mutex there
+        candidates = np.flatnonzero(self.action_level == NOT_YET)
+        needs = pre[candidates]
+        applicable = (needs @ (~props_before).astype(np.float32)) == 0
+        candidates = candidates[applicable]
+        needs = needs[applicable]
+        if len(candidates) and prop_mutex_before.any():
+            conflicts = ((needs @ prop_mutex_before.astype(np.float32)) * needs).sum(axis=1) > 0
+            candidates = candidates[~conflicts]
+        new_actions = candidates
+        self.action_level[new_actions] = level
+        actions = np.flatnonzero(self.action_level <= level)
+
+        self.update_mutex_actions(level, new_actions, actions, prop_mutex_before)
+
+        # The new propositions: added by a new action
+        new_props = np.flatnonzero(add[new_actions].any(axis=0) & ~props_before)
+        self.prop_level[new_props] = level
+        props = np.flatnonzero(self.prop_level <= level)
+
+        self.update_mutex_propositions(level, new_props, props, actions)
+
+        self.prop_bits.append(mask_to_bits(self.prop_level <= level))
+        self.action_bits.append(mask_to_bits(self.action_level <= level))
+        self.num_prop_mutexes.append(len(self.open_prop_pairs[0]))
+        if self.is_fixed(level):
+            self.fixed_level = level
+
+    def update_mutex_actions(self, level, new_actions, actions, prop_mutex_before):
+        """
+        Records the action mutexes of level: the pairs of a new action and an action of the level,
+        which are mutex if they interfere (for good) or have competing needs,
+        and the pairs that had competing needs in the last level, which are mutex if they still do
+        """
+        pre = PlanGraphLevel.incidence[0]
+        interference = PlanGraphLevel.get_interference()
+        mutex_before = prop_mutex_before.astype(np.float32)
+
+        # Open pairs that still have competing needs stay mutex
+        (rows, cols) = self.open_action_pairs
+        if len(rows):
+            (involved, position) = positions(pre.shape[0], rows, cols)
+            competing = (pre[involved] @ mutex_before @ pre[involved].T) > 0
+            still = competing[position[rows], position[cols]]
+            (rows, cols) = (rows[still], cols[still])
+            self.action_mutex_until[rows, cols] = level
+            self.action_mutex_until[cols, rows] = level
+
+        if len(new_actions):
+            interfere = interference[np.ix_(new_actions, actions)]
+            competing = (pre[new_actions] @ mutex_before @ pre[actions].T) > 0
+            # A pair of two new actions shows up in both orders; keep it once, and no action is mutex with itself
+            keep = ~np.isin(actions, new_actions)[np.newaxis, :] | (new_actions[:, np.newaxis] < actions[np.newaxis, :])
+            (i, j) = np.nonzero(interfere & keep)
+            self.action_mutex_until[new_actions[i], actions[j]] = FOREVER
+            self.action_mutex_until[actions[j], new_actions[i]] = FOREVER
+            (i, j) = np.nonzero(competing & ~interfere & keep)
+            (a1, a2) = (new_actions[i], actions[j])
+            self.action_mutex_until[a1, a2] = level
+            self.action_mutex_until[a2, a1] = level
+            rows = np.concatenate([rows, np.minimum(a1, a2)])
+            cols = np.concatenate([cols, np.maximum(a1, a2)])
+        self.open_action_pairs = (rows, cols)
+
+    def update_mutex_propositions(self, level, new_props, props, actions):
+        """
+        Records the proposition mutexes of level: the pairs of a new proposition and a proposition of the level,
+        and the pairs that were mutex in the last level, are mutex if every producer of one is mutex
+        with every producer of the other (an action is not mutex with itself)
+        """
+        add = PlanGraphLevel.incidence[1]
+        (rows, cols) = self.open_prop_pairs
+        if len(new_props):
+            is_new = np.isin(props, new_props)
+            (i, j) = np.nonzero(is_new[:, np.newaxis] | is_new[np.newaxis, :])
+            pairs = i < j
+            rows = np.concatenate([rows, props[i[pairs]]])
+            cols = np.concatenate([cols, props[j[pairs]]])
+        if not len(rows):
+            self.open_prop_pairs = (rows, cols)
+            return
+
+        # Only the producers of the propositions to check matter
+        (checked, position) = positions(add.shape[1], rows, cols)
+        producers = actions[add[np.ix_(actions, checked)].any(axis=1)]
+        not_mutex = (self.action_mutex_until[np.ix_(producers, producers)] < level).astype(np.float32)
+        produces = add[np.ix_(producers, checked)].T
+        compatible = (produces @ not_mutex @ produces.T) > 0
+        compatible = compatible[position[rows], position[cols]]
+
+        (rows, cols) = (rows[~compatible], cols[~compatible])
+        self.prop_mutex_until[rows, cols] = level
+        self.prop_mutex_until[cols, rows] = level
+        self.open_prop_pairs = (rows, cols)
+
+    def is_fixed(self, level):
+        """
+        Returns true if level is the same as the level before it, so every later level would be too
+        """
+        return level > 0 and self.prop_bits[level] == self.prop_bits[level - 1] and \
+            self.num_prop_mutexes[level] == self.num_prop_mutexes[level - 1]
+
+    def get_prop_bits(self, level):  # returns the bitset of the propositions of level
+        return self.prop_bits[level]
+
+    def get_action_bits(self, level):  # returns the bitset of the actions of level
+        return self.action_bits[level]
+
+    def recorded_level(self, level):  # returns the level whose mutexes are recorded for level
+        return level if self.fixed_level is None else min(level, self.fixed_level)
+
+    def mutex_props(self, level):
+        """
+        Returns the matrix of the propositions that are mutex in level
+        """
+        level = self.recorded_level(level)
+        present = self.prop_level <= level
+        return (self.prop_mutex_until >= level) & present[:, np.newaxis] & present[np.newaxis, :]
+
+    def mutex_actions(self, level):
+        """
+        Returns the matrix of the actions that are mutex in level
+        """
+        level = self.recorded_level(level)
+        present = self.action_level <= level
+        return (self.action_mutex_until >= level) & present[:, np.newaxis] & present[np.newaxis, :]
+
+    def get_proposition_layer(self, level):
+        """
+        Returns the proposition layer of level
+        """
+        layer = PropositionLayer()
+        layer.bits = self.prop_bits[level]
+        if self.num_prop_mutexes[level]:
+            layer.set_mutex_props(self.mutex_props(level))
+        return layer
+
+    def get_action_layer(self, level):
+        """
+        Returns the action layer of level
+        """
+        layer = ActionLayer()
+        layer.bits = self.action_bits[level]
+        if level > 0:
+            layer.set_mutex_actions(self.mutex_actions(level))
+        return layer
+
+    def get_level(self, level):
+        """
+        Returns level as a PlanGraphLevel
+        """
+        pg_level = PlanGraphLevel()
+        pg_level.set_action_layer(self.get_action_layer(level))
+        pg_level.set_proposition_layer(self.get_proposition_layer(level))
+        return pg_level
+
+    def __getitem__(self, level):
+        return self.get_level(level)
+
+
+def positions(n, rows, cols):
+    """
+    Returns the sorted indexes (out of n) that appear in rows or cols, and an array mapping each of them
+    to its position in the indexes
+    """
+    indexes = np.zeros(n, np.bool_)
+    indexes[rows] = True
+    indexes[cols] = True
+    indexes = np.flatnonzero(indexes)
+    position = np.zeros(n, np.intp)
+    position[indexes] = np.arange(len(indexes))
+    return indexes, position
@@ -1,29 +1,51 @@
+import numpy as np
+
 from action_layer import ActionLayer
-from util import Pair
-from proposition import Proposition
 from proposition_layer import PropositionLayer
+from util import bits_to_mask, mask_to_bits
 
 
 class PlanGraphLevel(object):
     """
     A class for representing a level in the plan graph.
     For each level i, the PlanGraphLevel consists of the actionLayer and propositionLayer at this level in this order!
+    Layers are bitsets over the indexes pgparser.index_domain gives the actions and propositions,
+    and a level is expanded with matrix products over the (pre, add, delete) incidence matrices of the domain,
+    restricted to the actions and propositions in the layers.
     """
-    independent_actions = set()  # updated to the independent_actions of the problem (graph_plan.py line 32)
-    actions = []  # updated to the actions of the problem (graph_plan.py line 33 and planning_problem.py line 36)
-    props = []  # updated to the propositions of the problem (graph_plan.py line 34 and planning_problem.py line 36)
+    interference = None  # the interference matrix of the problem (graph_plan.py, GraphPlan.independent)
+    actions = []  # updated to the actions of the problem by index (graph_plan.py and planning_problem.py)
+    props = []  # updated to the propositions of the problem by index (graph_plan.py and planning_problem.py)
+    incidence = None  # updated to the (pre, add, delete) matrices of the problem (graph_plan.py and planning_problem.py)
+
+    @staticmethod
+    def set_interference(interference):
+        PlanGraphLevel.interference = interference
 
     @staticmethod
-    def set_independent_actions(independent_actions):
-        PlanGraphLevel.independent_actions = independent_actions
+    def get_interference():
+        """
+        Returns the interference matrix of the problem, computing it from the incidence matrices
+        the first time if it was not set
+        """
+        if PlanGraphLevel.interference is None:
+            PlanGraphLevel.interference = interference_matrix(PlanGraphLevel.incidence)
+        return PlanGraphLevel.interference
 
     @staticmethod
     def set_actions(actions):
         PlanGraphLevel.actions = actions
+        ActionLayer.actions = actions
 
     @staticmethod
     def set_props(props):
         PlanGraphLevel.props = props
+        PropositionLayer.props = props
+
+    @staticmethod
+    def set_incidence(incidence):
+        PlanGraphLevel.incidence = incidence
+        PlanGraphLevel.interference = None
 
     def __init__(self):
         """
@@ -47,128 +69,85 @@ class PlanGraphLevel(object):
     def update_action_layer(self, previous_proposition_layer):
         """
         Updates the action layer given the previous proposition layer (see proposition_layer.py)
-        You should add an action to the layer if its preconditions are in the previous propositions layer,
+        An action is added to the layer if its preconditions are in the previous propositions layer,
         and the preconditions are not pairwise mutex.
-        all_actions is the set of all the action (include noOp) in the domain
-        You might want to use those functions:
-        previous_proposition_layer.is_mutex(prop1, prop2) returns true
-        if prop1 and prop2 are mutex at the previous propositions layer
-        previous_proposition_layer.all_preconds_in_layer(action) returns true
-        if all the preconditions of action are in the previous propositions layer
-        self.actionLayer.addAction(action) adds action to the current action layer
+        Both tests are done for all the actions (include noOp) of the domain at once:
+        an action misses a precondition iff its pre row has a 1 outside the layer,
+        and has mutex preconditions iff pre * mutex * pre^T is not 0 for it
         """
-        all_actions = PlanGraphLevel.actions
-        "*** YOUR CODE HERE ***"
+        pre = PlanGraphLevel.incidence[0]
+        absent = ~bits_to_mask(previous_proposition_layer.get_bits(), pre.shape[1])
+        applicable = (pre @ absent.astype(np.float32)) == 0
+
+        if previous_proposition_layer.num_mutex_props():
+            candidates = np.flatnonzero(applicable)
+            needs = pre[candidates]
+            mutex = previous_proposition_layer.get_mutex_props().astype(np.float32)
+            conflicts = ((needs @ mutex) * needs).sum(axis=1) > 0
+            applicable[candidates[conflicts]] = False
 
-        for action in all_actions:
-            if previous_proposition_layer.all_preconds_in_layer(action):
-                self.action_layer.add_action(action)
+        self.action_layer.bits = mask_to_bits(applicable)
 
     def update_mutex_actions(self, previous_layer_mutex_proposition):
         """
-        Updates the mutex set in self.action_layer,
-        given the mutex proposition from the previous layer.
-        current_layer_actions are the actions in the current action layer
-        You might want to use this function:
-        self.actionLayer.add_mutex_actions(action1, action2)
-        adds the pair (action1, action2) to the mutex set in the current action layer
+        Updates the mutex matrix in self.action_layer,
+        given the mutex proposition matrix from the previous layer.
+        Two actions are mutex if they have inconsistent effects or interfere,
+        which does not depend on the level and is read from the interference matrix of the problem,
+        or have competing needs (they need propositions that were mutex in the previous layer:
+        pre * mutex * pre^T).
         Note that an action is *not* mutex with itself
         """
-        current_layer_actions = self.action_layer.get_actions()
-
-        current_layer_actions = self.action_layer.get_actions()
-
-        # Convert the current_layer_actions set to a list to allow indexing
-        current_layer_actions = list(current_layer_actions)
-
-        for i in range(len(current_layer_actions)):
-            for j in range(i + 1, len(current_layer_actions)):
-                a1 = current_layer_actions[i]
-                a2 = current_layer_actions[j]
-
-                # Check for inconsistent effects
-                if any(effect in a1.get_delete() for effect in a2.get_add()) or \
-                        any(effect in a2.get_delete() for effect in a1.get_add()):
-                    self.action_layer.add_mutex_actions(a1, a2)
-                    continue
-
-                # Check for interference
-                if any(pre in a1.get_delete() for pre in a2.get_pre()) or \
-                        any(pre in a2.get_delete() for pre in a1.get_pre()):
-                    self.action_layer.add_mutex_actions(a1, a2)
-                    continue
-
-                # Check for competing needs
-                competing_needs = False
-                for pre1 in a1.get_pre():
-                    for pre2 in a2.get_pre():
-                        if Pair(pre1, pre2) in previous_layer_mutex_proposition:
-                            competing_needs = True
-                            break
-                    if competing_needs:
-                        break
-
-                if competing_needs:
-                    self.action_layer.add_mutex_actions(a1, a2)
-
+        pre = PlanGraphLevel.incidence[0]
+        interference = PlanGraphLevel.get_interference()
+        layer = np.flatnonzero(bits_to_mask(self.action_layer.get_bits(), pre.shape[0]))
+        pre = pre[layer]
+
+        if len(layer) == len(PlanGraphLevel.actions):
+            mutex = interference.copy()
+        else:
+            mutex = interference[np.ix_(layer, layer)]
+        if previous_layer_mutex_proposition is not None and previous_layer_mutex_proposition.any():
+            mutex |= (pre @ previous_layer_mutex_proposition.astype(np.float32) @ pre.T) > 0
+        np.fill_diagonal(mutex, False)
+
+        if len(layer) == len(PlanGraphLevel.actions):
+            self.action_layer.set_mutex_actions(mutex)
+        else:
+            self.action_layer.get_mutex_actions()[np.ix_(layer, layer)] = mutex
 
     def update_proposition_layer(self):
         """
         Updates the propositions in the current proposition layer,
-        given the current action layer.
-        don't forget to update the producers list!
-        Note that same proposition in different layers might have different producers lists,
-        hence you should create two different instances.
-        current_layer_actions is the set of all the actions in the current layer.
-        You might want to use those functions:
-        dict() creates a new dictionary that might help to keep track on the propositions that you've
-               already added to the layer
-        self.proposition_layer.add_proposition(prop) adds the proposition prop to the current layer
-
+        given the current action layer: the propositions added by one of its actions.
+        The producers of a proposition in this layer are
+        prop.producer_mask & self.action_layer.get_bits()
         """
-        current_layer_actions = self.action_layer.get_actions()
-        "*** YOUR CODE HERE ***"
-
-        # Dictionary to keep track of propositions and their producers
-        proposition_dict = {}
-
-        for action in current_layer_actions:
-            for prop in action.get_add():
-                if prop not in proposition_dict:
-                    # Create a new instance of the proposition and set its producers
-                    new_prop = Proposition(prop.get_name())
-                    new_prop.set_producers([action])
-                    proposition_dict[prop] = new_prop
-                else:
-                    # Update the producers list of the existing proposition instance
-                    proposition_dict[prop].add_producer(action)
-
-        # Add propositions to the current proposition layer
-        for prop in proposition_dict.values():
-            self.proposition_layer.add_proposition(prop)
-
+        add = PlanGraphLevel.incidence[1]
+        in_layer = bits_to_mask(self.action_layer.get_bits(), add.shape[0])
+        self.proposition_layer.bits = mask_to_bits(add[in_layer].any(axis=0))
 
     def update_mutex_proposition(self):
         """
-        updates the mutex propositions in the current proposition layer
-        You might want to use those functions:
-        mutex_propositions(prop1, prop2, current_layer_mutex_actions) returns true
-        if prop1 and prop2 are mutex in the current layer
-        self.proposition_layer.add_mutex_prop(prop1, prop2) adds the pair (prop1, prop2)
-        to the mutex set of the current layer
+        updates the mutex propositions in the current proposition layer:
+        two propositions are mutex if every producer of one is mutex with every producer of the other,
+        that is producers * (not mutex actions) * producers^T is 0 for them
+        (an action is not mutex with itself, so a shared producer counts)
         """
-        current_layer_propositions = self.proposition_layer.get_propositions()
-        current_layer_mutex_actions = self.action_layer.get_mutex_actions()
-        "*** YOUR CODE HERE ***"
-
-        propositions = list(current_layer_propositions)
-
-        for i in range(len(propositions)):
-            for j in range(i + 1, len(propositions)):
-                prop1 = propositions[i]
-                prop2 = propositions[j]
-                if mutex_propositions(prop1, prop2, current_layer_mutex_actions):
-                    self.proposition_layer.add_mutex_prop(prop1, prop2)
+        add = PlanGraphLevel.incidence[1]
+        actions = np.flatnonzero(bits_to_mask(self.action_layer.get_bits(), add.shape[0]))
+        layer = np.flatnonzero(bits_to_mask(self.proposition_layer.get_bits(), add.shape[1]))
+
+        producers = add[np.ix_(actions, layer)].T
+        action_mutex = self.action_layer.get_mutex_actions()
+        if len(actions) < len(PlanGraphLevel.actions):
+            action_mutex = action_mutex[np.ix_(actions, actions)]
+        mutex = (producers @ (~action_mutex).astype(np.float32) @ producers.T) == 0
+        np.fill_diagonal(mutex, False)
+        if len(layer) == len(PlanGraphLevel.props):
+            self.proposition_layer.set_mutex_props(mutex)
+        elif mutex.any():
+            self.proposition_layer.get_mutex_props()[np.ix_(layer, layer)] = mutex
 
     def expand(self, previous_layer):
         """
@@ -180,7 +159,7 @@ class PlanGraphLevel(object):
         set the propositions and their mutex relations in the proposition layer.
         """
         previous_proposition_layer = previous_layer.get_proposition_layer()
-        previous_layer_mutex_proposition = previous_proposition_layer.get_mutex_props()
+        previous_layer_mutex_proposition = previous_proposition_layer.mutex
 
         "*** YOUR CODE HERE ***"
 
@@ -208,58 +187,47 @@ class PlanGraphLevel(object):
         # We do not update mutex actions and mutex propositions
 
 
+def interference_matrix(incidence):
+    """
+    Returns the interference matrix of a domain from its (pre, add, delete) incidence matrices:
+    entry [i, j] is True iff actions i and j are not independent, that is one of them deletes
+    a precondition or a positive effect of the other.
+    The diagonal is True for the actions that delete one of their own preconditions
+    """
+    (pre, add, delete) = incidence
+    interfere = ((add + pre) @ delete.T) > 0
+    return interfere | interfere.T
+
+
 def mutex_actions(a1, a2, mutex_props):
     """
     This function returns true if a1 and a2 are mutex actions.
-    We first check whether a1 and a2 are in PlanGraphLevel.independent_actions,
-    this is the list of all the independent pair of actions (according to your implementation in question 1).
+    We first check whether a1 and a2 interfere according to the interference matrix of the problem
+    (see independent in graph_plan.py).
     If not, we check whether a1 and a2 have competing needs
     """
-    if Pair(a1, a2) not in PlanGraphLevel.independent_actions:
+    if PlanGraphLevel.get_interference()[a1.index, a2.index]:
         return True
     return have_competing_needs(a1, a2, mutex_props)
 
 
 def have_competing_needs(a1, a2, mutex_props):
     """
-    Complete code for deciding whether actions a1 and a2 have competing needs,
-    given the mutex proposition from previous level (list of pairs of propositions).
-    Hint: for propositions p  and q, the command  "Pair(p, q) in mutex_props"
-          returns true if p and q are mutex in the previous level
+    Returns true if actions a1 and a2 have competing needs,
+    given the mutex proposition matrix from previous level (see PropositionLayer.get_mutex_props)
     """
-    "*** YOUR CODE HERE ***"
-
-    # Get the preconditions for both actions
-    preconditions_a1 = a1.get_pre()
-    preconditions_a2 = a2.get_pre()
-
-    # Check if any pair of preconditions from a1 and a2 are mutex
-    for p1 in preconditions_a1:
-        for p2 in preconditions_a2:
-            if Pair(p1, p2) in mutex_props:
-                return True
+    pre1 = [p.index for p in a1.get_pre()]
+    pre2 = [p.index for p in a2.get_pre()]
+    return bool(mutex_props[np.ix_(pre1, pre2)].any())
 
-    return False
 
-
-def mutex_propositions(prop1, prop2, mutex_actions_list):
+def mutex_propositions(prop1, prop2, action_layer):
     """
-    complete code for deciding whether two propositions are mutex,
-    given the mutex action from the current level (set of pairs of actions).
-    Your update_mutex_proposition function should call this function
-    You might want to use this function:
-    prop1.get_producers() returns the set of all the possible actions in the layer that have prop1 on their add list
+    Returns true if two propositions are mutex in the level of action_layer,
+    that is every producer of prop1 in the layer is mutex with every producer of prop2 in it
     """
-    "*** YOUR CODE HERE ***"
-
-    # Get the list of producers for both propositions
-    producers_prop1 = prop1.get_producers()
-    producers_prop2 = prop2.get_producers()
-
-    # Check pairwise mutex for all producers
-    for action1 in producers_prop1:
-        for action2 in producers_prop2:
-            if Pair(action1, action2) not in mutex_actions_list:
-                return False
-
-    return True
+    action_bits = action_layer.get_bits()
+    num_actions = len(ActionLayer.actions)
+    producers_prop1 = np.flatnonzero(bits_to_mask(prop1.producer_mask & action_bits, num_actions))
+    producers_prop2 = np.flatnonzero(bits_to_mask(prop2.producer_mask & action_bits, num_actions))
+    return bool(action_layer.get_mutex_actions()[np.ix_(producers_prop1, producers_prop2)].all())
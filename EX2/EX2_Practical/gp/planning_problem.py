@@ -1,10 +1,10 @@
 from typing import FrozenSet
 
-from util import Pair
+from util import bitset
 import copy
 from proposition_layer import PropositionLayer
 from plan_graph_level import PlanGraphLevel
-from pgparser import PgParser
+from pgparser import PgParser, index_domain
 from action import Action
 
 try:
@@ -38,8 +38,13 @@ class PlanningProblem:
         self.create_noops()
         # creates noOps that are used to propagate existing propositions from one layer to the next
 
+        incidence = index_domain(self.actions, self.propositions)
+        self.goal_mask = bitset(self.goal)
+        # numbers the actions and propositions, so the heuristics' plan graph layers are bitsets
+
         PlanGraphLevel.set_actions(self.actions)
         PlanGraphLevel.set_props(self.propositions)
+        PlanGraphLevel.set_incidence(incidence)
         self.expanded = 0
 
     def get_start_state(self):
@@ -89,13 +94,10 @@ class PlanningProblem:
 
     def goal_state_not_in_prop_layer(self, propositions):
         """
-        Helper function that receives a  list of propositions (propositions) and returns true
-        if not all the goal propositions are in that list
+        Helper function that receives the bitset of a proposition layer (propositions) and returns true
+        if not all the goal propositions are in that layer
         """
-        for goal in self.goal:
-            if goal not in propositions:
-                return True
-        return False
+        return self.goal_mask & ~propositions != 0
 
     def create_noops(self):
         """
@@ -138,7 +140,7 @@ def max_level(state, planning_problem):
     while True:
         current_layer = graph[-1]
 
-        if not planning_problem.goal_state_not_in_prop_layer(current_layer.get_proposition_layer().get_propositions()):
+        if not planning_problem.goal_state_not_in_prop_layer(current_layer.get_proposition_layer().get_bits()):
             return level
 
         if is_fixed(graph, level):
@@ -167,17 +169,18 @@ def level_sum(state, planning_problem):
 
     level = 0
     graph = [pg_init]
-    goal_found_at_level = {goal: None for goal in planning_problem.goal}
+    level_sum_so_far = 0
+    goals_left = planning_problem.goal_mask
 
     while True:
         current_layer = graph[-1]
 
-        for goal in planning_problem.goal:
-            if goal in current_layer.get_proposition_layer().get_propositions() and goal_found_at_level[goal] is None:
-                goal_found_at_level[goal] = level
+        goals_found = goals_left & current_layer.get_proposition_layer().get_bits()
+        level_sum_so_far += level * goals_found.bit_count()
+        goals_left &= ~goals_found
 
-        if all(v is not None for v in goal_found_at_level.values()):
-            return sum(goal_found_at_level.values())
+        if not goals_left:
+            return level_sum_so_far
 
         if is_fixed(graph, level):
             return float('inf')
@@ -196,8 +199,7 @@ def is_fixed(graph, level):
     """
     if level == 0:
         return False
-    return len(graph[level].get_proposition_layer().get_propositions()) == len(
-        graph[level - 1].get_proposition_layer().get_propositions())
+    return graph[level].get_proposition_layer().get_bits() == graph[level - 1].get_proposition_layer().get_bits()
 
 
 def null_heuristic(*args, **kwargs):
@@ -4,6 +4,9 @@ class Proposition(object):
     Each proposition object has a name and a list of producers,
     that is the actions that have the proposition on their add set.
     Two propositions are considered equal if they have the same name.
+    Once the domain is numbered by pgparser.index_domain, each proposition also
+    has an index and bitsets of the indexes of the actions that add, need and
+    delete it.
     """
 
     def __init__(self, name):
@@ -12,6 +15,10 @@ class Proposition(object):
         """
         self.name = name  # the name of the proposition as string
         self.producers = []  # list of all possible actions in the layer that have the proposition on their add list
+        self.index = None  # the number of the proposition in the domain
+        self.producer_mask = 0  # bitset of the actions that have the proposition on their add list
+        self.consumer_mask = 0  # bitset of the actions that have the proposition as a precondition
+        self.deleter_mask = 0  # bitset of the actions that have the proposition on their delete list
 
     def get_name(self):
         return self.name
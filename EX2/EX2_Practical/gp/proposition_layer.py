@@ -1,69 +1,82 @@
-from util import Pair
+import numpy as np
+
+from util import iter_bits
 
 
 class PropositionLayer(object):
     """
     A class for an PropositionLayer  in a level of the graph.
-    The layer contains a set of propositions (Proposition objects) and a set of mutex propositions (Pair objects)
+    The layer contains a set of propositions, kept as a bitset of their indexes (see pgparser.index_domain),
+    and the mutex relation between them, kept as a boolean matrix over all the propositions of the problem:
+    mutex[i, j] is True iff propositions i and j are mutex in the layer (None while there are no mutexes)
     """
+    props = []  # all the propositions of the problem by index (set by PlanGraphLevel.set_props)
 
     def __init__(self):
         """
         Constructor
         """
-        self.propositions = set()
-        # set of all the propositions in the layer
-        self.mutexPropositions = set()
-        # set of pairs of propositions that are mutex in the layer
+        self.bits = 0
+        # bitset of all the propositions in the layer
+        self.mutex = None
+        # matrix of the propositions that are mutex in the layer
 
     def add_proposition(self, proposition):
         # adds proposition to the propositions set
-        self.propositions.add(proposition)
+        self.bits |= 1 << proposition.index
 
     def remove_propositions(self, proposition):
         # remove proposition from the propositions set
-        self.propositions.remove(proposition)
+        self.bits &= ~(1 << proposition.index)
 
     def get_propositions(self):
         # returns the propositions set
-        return self.propositions
+        return {PropositionLayer.props[i] for i in iter_bits(self.bits)}
+
+    def get_bits(self):
+        # returns the bitset of the propositions in the layer
+        return self.bits
 
     def add_mutex_prop(self, p1, p2):
-        # adds the pair(p1,p2) to the mutex propositions set
-        self.mutexPropositions.add(Pair(p1, p2))
+        # adds the pair(p1,p2) to the mutex propositions matrix
+        mutex = self.get_mutex_props()
+        mutex[p1.index, p2.index] = mutex[p2.index, p1.index] = True
 
     """
     returns true if proposition p1 and proposition p2 are mutex at this layer
     """
 
     def is_mutex(self, p1, p2):
-        return Pair(p1, p2) in self.mutexPropositions
+        return self.mutex is not None and bool(self.mutex[p1.index, p2.index])
+
+    def get_mutex_props(self):  # returns the mutex propositions matrix
+        if self.mutex is None:
+            n = len(PropositionLayer.props)
+            self.mutex = np.zeros((n, n), np.bool_)
+        return self.mutex
 
-    def get_mutex_props(self):  # returns the mutex propositions set
-        return self.mutexPropositions
+    def set_mutex_props(self, mutex):  # sets the mutex propositions matrix
+        self.mutex = mutex
+
+    def num_mutex_props(self):  # returns the number of mutex pairs of propositions
+        return int(np.count_nonzero(self.mutex)) // 2 if self.mutex is not None else 0
 
     def all_preconds_in_layer(self, action):
         """
         returns true if all propositions that are preconditions of the
         action exist in this layer (i.e. the action can be applied)
+        and no two of them are mutex
         """
-        action_pre = action.get_pre()
-        for pre in action_pre:
-            if not (pre in self.propositions):
-                return False
-
-        for i in range(len(action_pre)):
-            for j in range(i + 1, len(action_pre)):
-                pre1 = action_pre[i]
-                pre2 = action_pre[j]
-                if Pair(pre1, pre2) in self.mutexPropositions:
-                    return False
-
-        return True
+        if action.pre_mask & ~self.bits:
+            return False
+        if self.mutex is None:
+            return True
+        pre = [prop.index for prop in action.get_pre()]
+        return not self.mutex[np.ix_(pre, pre)].any()
 
     def __eq__(self, other):
-        return (isinstance(other, self.__class__)
-                and self.__dict__ == other.__dict__)
+        return (isinstance(other, self.__class__) and self.bits == other.bits
+                and np.array_equal(self.get_mutex_props(), other.get_mutex_props()))
 
     def __ne__(self, other):
         return not self.__eq__(other)
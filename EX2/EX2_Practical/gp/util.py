@@ -3,6 +3,8 @@ import inspect
 import heapq
 import random
 
+import numpy as np
+
 
 class Pair(object):
     """
@@ -34,6 +36,42 @@ class Pair(object):
         return hash(self.a) + hash(self.b)
 
 
+def bitset(items):
+    """
+    Returns the bitset (an int) with bit item.index set for each of the items,
+    propositions or actions numbered by pgparser.index_domain
+    """
+    bits = 0
+    for item in items:
+        bits |= 1 << item.index
+    return bits
+
+
+def iter_bits(bits):
+    """
+    Yields the indexes of the set bits of the int bits, lowest first
+    """
+    while bits:
+        low = bits & -bits
+        yield low.bit_length() - 1
+        bits ^= low
+
+
+def bits_to_mask(bits, n):
+    """
+    Returns the bitset bits as a boolean numpy vector of length n
+    """
+    data = np.frombuffer(bits.to_bytes((n + 7) // 8, 'little'), np.uint8)
+    return np.unpackbits(data, count=n, bitorder='little').astype(bool)
+
+
+def mask_to_bits(mask):
+    """
+    Returns the boolean numpy vector mask as a bitset
+    """
+    return int.from_bytes(np.packbits(mask, bitorder='little').tobytes(), 'little')
+
+
 """
  Data structures useful for implementing SearchAgents
 """